@@ -1,8 +1,11 @@
 import argparse
+import json
 import logging
+from datetime import datetime
 
 import honcho.logs  # noqa - has to be 1st
-from honcho.config import AQUADOPP_IDS, GPIO, LOOK_PTZ, SEABIRD_IDS
+from honcho.config import (AQUADOPP_IDS, GPIO, LOOK_PTZ, SCHEDULE_NAMES, SCHEDULES,
+                           SEABIRD_IDS)
 from honcho.tasks import import_task
 from honcho.util import ensure_all_dirs
 from honcho.version import version
@@ -35,6 +38,17 @@ def sched_handler(args):
         sched.execute()
     if args.summary:
         sched.print_summary()
+    if args.simulate:
+        if args.start:
+            start = datetime.strptime(args.start, "%Y-%m-%d")
+        else:
+            start = datetime.now()
+        name = args.name or sched.select_schedule(start)
+        runtimes = sched.load_runtimes(SCHEDULES[name], args.log_dir)
+        result = sched.simulate(
+            name, start, args.simulate, runtimes, exact=not args.polling
+        )
+        sched.print_simulation(result)
 
 
 def add_schedule_parser(subparsers):
@@ -45,6 +59,33 @@ def add_schedule_parser(subparsers):
     parser.add_argument(
         "--summary", help="Show schedule summary", action="store_true", dest="summary"
     )
+    parser.add_argument(
+        "--simulate",
+        help="Replay the schedule for DAYS on a virtual clock",
+        metavar="DAYS",
+        type=int,
+        dest="simulate",
+    )
+    parser.add_argument(
+        "--start", help="Simulation start date (YYYY-MM-DD)", dest="start"
+    )
+    parser.add_argument(
+        "--name",
+        help="Simulated schedule (default: selected by start date)",
+        choices=SCHEDULE_NAMES,
+        dest="name",
+    )
+    parser.add_argument(
+        "--logs",
+        help="Directory of task execution logs for simulated runtimes",
+        dest="log_dir",
+    )
+    parser.add_argument(
+        "--polling",
+        help="Simulate checking every interval instead of exact wake-ups",
+        action="store_true",
+        dest="polling",
+    )
 
 
 def gpio_handler(args):
@@ -202,6 +243,10 @@ def sbd_handler(args):
         sbd.clear_queue()
     elif args.run:
         sbd.execute()
+    elif args.schema:
+        print(json.dumps(sbd.binary_schemas(), indent=2, sort_keys=True))
+    elif args.dictionary_version is not None:
+        sbd.train_dictionary(args.dictionary_version)
 
 
 def add_sbd_parser(subparsers):
@@ -221,6 +266,19 @@ def add_sbd_parser(subparsers):
     group.add_argument(
         "--run", help="Send queued SBDs", action="store_true", dest="run"
     )
+    group.add_argument(
+        "--schema",
+        help="Print binary SBD schema for ground decoding",
+        action="store_true",
+        dest="schema",
+    )
+    group.add_argument(
+        "--train-dictionary",
+        help="Train SBD compression dictionary version X from data logs",
+        action="store",
+        dest="dictionary_version",
+        type=int,
+    )
 
 
 def solar_handler(args):
@@ -282,6 +340,9 @@ def imm_handler(args):
     if args.repl:
         imm.repl()
 
+    if args.run:
+        import_task("imm").execute()
+
 
 def add_imm_parser(subparsers):
     parser = subparsers.add_parser("imm")
@@ -290,6 +351,12 @@ def add_imm_parser(subparsers):
     parser.add_argument(
         "--repl", help="Start imm repl", action="store_true", dest="repl"
     )
+    parser.add_argument(
+        "--run",
+        help="Execute seabird and aquadopp routines in one session",
+        action="store_true",
+        dest="run",
+    )
 
 
 def aquadopp_handler(args):
@@ -456,6 +523,31 @@ def add_upload_parser(subparsers):
     )
 
 
+def archive_handler(args):
+    archive = import_task("archive")
+
+    if args.benchmark:
+        archive.print_benchmark(archive.benchmark_codecs())
+    if args.run:
+        archive.execute()
+
+
+def add_archive_parser(subparsers):
+    parser = subparsers.add_parser("archive")
+    parser.set_defaults(handler=archive_handler)
+
+    parser.add_argument(
+        "--run", help="Execute routine", action="store_true", dest="run"
+    )
+
+    parser.add_argument(
+        "--benchmark",
+        help="Compare codecs on the data waiting to be archived",
+        action="store_true",
+        dest="benchmark",
+    )
+
+
 def camera_handler(args):
     camera = import_task("camera")
 
@@ -469,6 +561,10 @@ def camera_handler(args):
     if args.look:
         ptz = LOOK_PTZ[args.look.upper()]["ptz"]
         camera.set_ptz(*ptz)
+    if args.benchmark_filepath:
+        camera.print_image_benchmark(
+            camera.benchmark_image_processing(args.benchmark_filepath)
+        )
     if args.run:
         camera.execute()
 
@@ -496,6 +592,12 @@ def add_camera_parser(subparsers):
     parser.add_argument(
         "--look", help="Look at preconfigured location", action="store", dest="look"
     )
+    parser.add_argument(
+        "--benchmark",
+        help="Time image processing of a full snapshot for each look",
+        action="store",
+        dest="benchmark_filepath",
+    )
 
 
 def crx_handler(args):
@@ -631,6 +733,7 @@ def build_parser():
     add_seabird_parser(subparsers)
     add_dts_parser(subparsers)
     add_upload_parser(subparsers)
+    add_archive_parser(subparsers)
     add_imm_parser(subparsers)
     add_camera_parser(subparsers)
     add_crx_parser(subparsers)
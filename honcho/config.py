@@ -65,15 +65,22 @@ SCHEDULE_START_TIMES = {
 
 # Time to wait in between schedule tasks/checks
 SCHEDULE_IDLE_CHECK_INTERVAL = 30
+# Sleep until the next job is due instead of checking every interval
+SCHEDULE_EXACT_WAKEUP = True
+# Seconds between apmsleep ending and the schedule resuming, standby ends this much
+# early. Estimate is updated by STANDBY_LATENCY_WEIGHT of each measured resume.
+STANDBY_RESUME_LATENCY = 10
+STANDBY_LATENCY_WEIGHT = 0.25
+# Runtime assumed for simulated tasks without execution log stats
+SCHEDULE_SIMULATED_RUNTIME = 60
 
 
 SCHEDULES = {
     SCHEDULE_NAMES.WINTER: (
         ('scheduler.every().hour.at(":40")', 'sbd'),
         ('scheduler.every().hour.at(":45")', 'gps'),
-        ('scheduler.every().hour.at(":46")', 'seabird'),
+        ('scheduler.every().hour.at(":46")', 'imm'),
         ('scheduler.every().hour.at(":47")', 'solar'),
-        ('scheduler.every().hour.at(":49")', 'aquadopp'),
         ('scheduler.every().hour.at(":50")', 'crx'),
         ('scheduler.every().hour.at(":52")', 'weather'),
         ('scheduler.every().hour.at(":55")', 'sbd'),
@@ -82,8 +89,7 @@ SCHEDULES = {
         ('scheduler.every().day.at("06:00")', 'upload'),
         ('scheduler.every().day.at("07:00")', 'dts'),
         ('scheduler.every().day.at("11:00")', 'tps'),
-        ('scheduler.every().day.at("12:00")', 'upload'),
-        ('scheduler.every().day.at("12:00")', 'orders'),
+        ('scheduler.every().day.at("12:00")', 'comms'),
         ('scheduler.every().day.at("17:00")', 'tps'),
         ('scheduler.every().day.at("18:00")', 'camera'),
         ('scheduler.every().day.at("20:00")', 'upload'),
@@ -94,9 +100,8 @@ SCHEDULES = {
     SCHEDULE_NAMES.SUMMER: (
         ('scheduler.every().hour.at(":40")', 'sbd'),
         ('scheduler.every().hour.at(":45")', 'gps'),
-        ('scheduler.every().hour.at(":46")', 'seabird'),
+        ('scheduler.every().hour.at(":46")', 'imm'),
         ('scheduler.every().hour.at(":47")', 'solar'),
-        ('scheduler.every().hour.at(":49")', 'aquadopp'),
         ('scheduler.every().hour.at(":50")', 'crx'),
         ('scheduler.every().hour.at(":52")', 'weather'),
         ('scheduler.every().hour.at(":55")', 'sbd'),
@@ -146,18 +151,15 @@ SCHEDULES = {
         # ('scheduler.every(2).hours', 'tps'),
     ),
     SCHEDULE_NAMES.TEST: (
-        ('scheduler.every(1).minutes', 'seabird'),
+        ('scheduler.every(1).minutes', 'imm'),
         ('scheduler.every(1).minutes', 'solar'),
-        ('scheduler.every(1).minutes', 'aquadopp'),
         ('scheduler.every(1).minutes', 'crx'),
         ('scheduler.every(1).minutes', 'gps'),
         ('scheduler.every(1).minutes', 'weather'),
         ('scheduler.every(1).minutes', 'dts'),
         ('scheduler.every(1).minutes', 'camera'),
         ('scheduler.every(1).minutes', 'tps'),
-        ('scheduler.every(1).minutes', 'sbd'),
-        ('scheduler.every(1).minutes', 'upload'),
-        ('scheduler.every(1).minutes', 'orders'),
+        ('scheduler.every(1).minutes', 'comms'),
         ('scheduler.every(1).minutes', 'archive'),
     ),
     SCHEDULE_NAMES.SAFE: (('scheduler.every().day.at("12:00")', 'orders'),),
@@ -214,6 +216,9 @@ GPIO_CONFIG = {
     GPIO.SOL: {"index": 2, "mask": int("0b00001000", 2)},
 }
 
+# Seconds to keep components on after use for reuse by the next task
+GPIO_KEEP_WARM = {}
+
 
 # --------------------------------------------------------------------------------
 # Up/downlink
@@ -223,6 +228,16 @@ SBD_PORT = "/dev/ttyS1"
 SBD_BAUD = 9600
 SBD_STARTUP_WAIT = 15
 SBD_MAX_SIZE = 1960
+SBD_RECORD_SEP = "|"
+# Tags sent in compact binary form, requires schema (honcho sbd --schema) on ground
+SBD_BINARY_TAGS = ()
+SBD_BINARY_FORMAT = 1
+# Compression dictionary (honcho sbd --train-dictionary) version, None to disable
+SBD_DICTIONARY_VERSION = None
+SBD_DICTIONARY_SIZE = 8 * 1024
+SBD_DICTIONARY_DIR = "/media/mmcblk0p1/sbd_dictionaries"
+SBD_COMPRESSED_FORMAT = 2
+SBD_COMPRESSION_PACK_FACTOR = 3
 SBD_SIGNAL_WAIT = 10
 SBD_SIGNAL_TRIES = 6
 SBD_WRITE_TIMEOUT = 30
@@ -236,6 +251,10 @@ def SBD_QUEUE_FILENAME(timestamp, tag):
     return timestamp.strftime(TIMESTAMP_FILENAME_FMT) + "_" + tag
 
 
+def SBD_DICTIONARY_FILEPATH(version):
+    return os.path.join(SBD_DICTIONARY_DIR, "{0:03d}.dict".format(version))
+
+
 # --------------------------------------------------------------------------------
 # Up/downlink
 # --------------------------------------------------------------------------------
@@ -248,6 +267,13 @@ FTP_CONNECT_RETRIES = 18
 FTP_RETRY_WAIT = 10
 FTP_ORDERS_DIR = "/orders"
 FTP_CHUNK_SIZE = 10000
+# Chunked upload sizes to pick from by expected goodput given the link stats of the
+# last FTP_LINK_HISTORY transfers, each chunk costing FTP_CHUNK_OVERHEAD seconds
+FTP_CHUNK_SIZES = (2500, 5000, 10000, 20000, 40000, 80000)
+FTP_CHUNK_OVERHEAD = 5
+FTP_LINK_HISTORY = 50
+# One XOR parity chunk per this many chunks to rebuild a lost chunk, 0 for none
+FTP_PARITY_GROUP = 10
 JOINER_TEMPLATE = "/media/mmcblk0p1/honcho/core/joiner.pytemplate"
 
 
@@ -298,7 +324,49 @@ TIMESTAMP_FILENAME_FMT = "%Y_%m_%d_%H_%M_%S"
 
 UPLOAD_QUEUE_DIR = "/media/mmcblk0p1/upload"
 UPLOAD_CLEANUP = True
+# Queued files are uploaded lowest priority class first (by the data tag in their
+# name), gaining one class per UPLOAD_AGEING_HOURS queued
+UPLOAD_PRIORITIES = {
+    DATA_TAGS.ORD: 0,
+    DATA_TAGS.PWR: 0,
+    DATA_TAGS.MON: 0,
+    DATA_TAGS.SBD: 1,
+    DATA_TAGS.GGA: 1,
+    DATA_TAGS.WXT: 1,
+    DATA_TAGS.SOL: 1,
+    DATA_TAGS.AQD: 1,
+    DATA_TAGS.CRX: 1,
+    DATA_TAGS.CAM: 2,
+    DATA_TAGS.DTS: 3,
+    DATA_TAGS.TPS: 3,
+    DATA_TAGS.BNX: 3,
+}
+UPLOAD_DEFAULT_PRIORITY = 2
+UPLOAD_AGEING_HOURS = 24
+# Upload session budget, files it can no longer take (by size and the link stats
+# throughput) are left queued for the next session
+UPLOAD_SESSION_BYTES = 1000000
+UPLOAD_SESSION_SECONDS = 45 * 60
 ARCHIVE_DIR = "/media/mmcblk0p1/archive"
+# Tarball codec per data tag (tarfile compression and level), "" only stores.
+# Benchmark on the station with 'honcho archive --benchmark'
+ARCHIVE_CODECS = {
+    DATA_TAGS.CAM: ("", None),
+    DATA_TAGS.DTS: ("bz2", 9),
+    DATA_TAGS.TPS: ("gz", 6),
+    DATA_TAGS.BNX: ("gz", 6),
+}
+ARCHIVE_DEFAULT_CODEC = ("gz", 9)
+# Files partially uploaded, remote partial files are only resumed if listed here
+UPLOAD_PROGRESS_FILEPATH = os.path.join(ARCHIVE_DIR, "upload_progress.json")
+# Checksums of uploaded content, queueing and uploading skip content already sent
+UPLOAD_MANIFEST_FILEPATH = os.path.join(ARCHIVE_DIR, "upload_manifest.json")
+UPLOAD_MANIFEST_SIZE = 5000
+# Append-only data logs shipped as segments of what was added since last queued
+UPLOAD_APPEND_LOG_TAGS = (DATA_TAGS.PWR,)
+UPLOAD_LOG_OFFSETS_FILEPATH = os.path.join(ARCHIVE_DIR, "upload_log_offsets.json")
+# Last FTP_LINK_HISTORY transfers, chunk sizes are picked from them
+FTP_LINK_STATS_FILEPATH = os.path.join(ARCHIVE_DIR, "ftp_link_stats.json")
 
 
 # --------------------------------------------------------------------------------
@@ -338,6 +406,34 @@ CAMERA_USERNAME = "admin"
 CAMERA_PASSWORD = "10iLtxyh"
 IMAGE_REDUCTION_FACTOR = "3/8"
 CAMERA_STARTUP_WAIT = 60
+# Moves are settled once GetStatus is within PTZ_TOLERANCE of the target on every
+# axis (and not MOVING), polled every PTZ_POLL_INTERVAL seconds. The timeout is the
+# fixed 5 s sleep this replaced, so a camera that never reports settling within
+# tolerance takes its snapshot no later than before
+PTZ_TOLERANCE = 0.01
+PTZ_POLL_INTERVAL = 0.5
+PTZ_SETTLE_TIMEOUT = 5
+# Process each look's image while the camera moves to the next, rather than
+# between moves
+CAMERA_PIPELINE = True
+# Looks darker than CAMERA_DARK_LUMINANCE (0-255), or changed less than
+# CAMERA_CHANGE_THRESHOLD (mean luminance difference over a CAMERA_FINGERPRINT_SIZE
+# square grid) from the last one uploaded, are only uploaded as a thumbnail
+CAMERA_FINGERPRINT_SIZE = 8
+CAMERA_CHANGE_THRESHOLD = 4
+CAMERA_DARK_LUMINANCE = 10
+CAMERA_THUMBNAIL_SCALE = "1/4"
+CAMERA_FINGERPRINTS_FILEPATH = os.path.join(ARCHIVE_DIR, "camera_fingerprints.json")
+# Looks reduced to more than their share of the next upload window (within these
+# bounds) are re-encoded to fit it, at the largest scale down the ladder and then
+# the highest quality that do
+CAMERA_MIN_TARGET_BYTES = 5000
+CAMERA_MAX_TARGET_BYTES = 60000
+CAMERA_MIN_QUALITY = 20
+CAMERA_MAX_QUALITY = 75
+CAMERA_SCALE_LADDER = ("1/2", "3/8", "1/4", "1/8")
+# Snapshots are streamed to disk in blocks of this many bytes
+SNAPSHOT_BLOCK_SIZE = 64 * 1024
 
 _LOOKS = ("SOUTH", "EAST", "WEST", "MIRROR", "DOWN")
 LOOKS = namedtuple("LOOKS", _LOOKS)(*_LOOKS)
@@ -1,8 +1,19 @@
 import os
+import re
+import tarfile
+from calendar import timegm
+from contextlib import closing
+from datetime import datetime
 from hashlib import md5
-from math import ceil
+from struct import pack, unpack_from
 
-from honcho.config import DATA_LOG_FILENAME, FTP_CHUNK_SIZE, JOINER_TEMPLATE, SEP
+from honcho.config import (DATA_LOG_FILENAME, FTP_CHUNK_SIZE, FTP_PARITY_GROUP,
+                           JOINER_TEMPLATE, SEP, TIMESTAMP_FMT)
+
+FIXED_PATTERN = r"^\{0:\.(?P<decimals>\d+)f\}$"
+HEX_PATTERN = r"^\{0:0?\d*X\}$"
+# Chunks being written by ChunkWriter, only complete once renamed
+PARTIAL_CHUNK_PATTERN = r"\.partial(parity)?\d+$"
 
 
 def log_serialized(s, tag):
@@ -37,6 +48,111 @@ def deserialize(serialized, conversions, constructor):
     return deserialized
 
 
+def binary_field(key, conversion):
+    if conversion == "{0:" + TIMESTAMP_FMT + "}":
+        kind, decimals = "time", None
+    elif re.match(FIXED_PATTERN, conversion):
+        kind = "fixed"
+        decimals = int(re.match(FIXED_PATTERN, conversion).group("decimals"))
+    elif conversion == "{0:d}":
+        kind, decimals = "int", None
+    elif re.match(HEX_PATTERN, conversion):
+        kind, decimals = "hex", None
+    else:
+        kind, decimals = "str", None
+
+    return {"name": key, "kind": kind, "decimals": decimals, "format": conversion}
+
+
+def binary_schema(keys, conversions):
+    """
+    Binary field layout matching the fields written by serialize
+    """
+    schema = []
+    for key in keys:
+        if key in conversions and conversions[key] is None:
+            continue
+        schema.append(binary_field(key, conversions.get(key, "{0}")))
+
+    return schema
+
+
+def _write_varint(buf, value):
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _read_varint(buf, pos):
+    value, shift = 0, 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            break
+    value = value // 2 if not value & 1 else -(value + 1) // 2
+
+    return value, pos
+
+
+def encode_binary(serialized, schema):
+    """
+    Pack a serialized record into bytes: timestamps as 4 byte epoch seconds,
+    numbers as zigzag varints (floats scaled by their formatted precision) and
+    strings length prefixed
+    """
+    values = serialized.split(SEP)
+    if len(values) != len(schema):
+        raise Exception("Expected {0} fields, got {1}".format(len(schema), len(values)))
+
+    buf = bytearray()
+    for field, value in zip(schema, values):
+        kind = field["kind"]
+        if kind == "time":
+            timestamp = datetime.strptime(value, TIMESTAMP_FMT)
+            buf.extend(pack(">I", timegm(timestamp.timetuple())))
+        elif kind == "fixed":
+            _write_varint(buf, int(round(float(value) * 10 ** field["decimals"])))
+        elif kind == "int":
+            _write_varint(buf, int(value))
+        elif kind == "hex":
+            _write_varint(buf, int(value, 16))
+        else:
+            encoded = value.encode("utf-8")
+            if len(encoded) > 255:
+                raise Exception("String field too long: {0}".format(field["name"]))
+            buf.append(len(encoded))
+            buf.extend(encoded)
+
+    return bytes(buf)
+
+
+def decode_binary(encoded, schema, pos=0):
+    buf = bytearray(encoded)
+    values = []
+    for field in schema:
+        kind = field["kind"]
+        if kind == "time":
+            (seconds,) = unpack_from(">I", buf, pos)
+            pos += 4
+            values.append(datetime.utcfromtimestamp(seconds).strftime(TIMESTAMP_FMT))
+        elif kind in ("fixed", "int", "hex"):
+            value, pos = _read_varint(buf, pos)
+            if kind == "fixed":
+                value = value / float(10 ** field["decimals"])
+            values.append(field["format"].format(value))
+        else:
+            length = buf[pos]
+            values.append(bytes(buf[pos + 1 : pos + 1 + length]).decode("utf-8"))
+            pos += 1 + length
+
+    return SEP.join(values), pos
+
+
 def print_samples(samples, conversion):
     print(", ".join(samples[0]._fields))
     print("-" * 80)
@@ -45,39 +161,183 @@ def print_samples(samples, conversion):
 
 
 def compute_checksum(filepath):
+    checksum = md5()
     with open(filepath, "rb") as f:
-        checksum = md5(f.read()).hexdigest()
+        for block in iter(lambda: f.read(FTP_CHUNK_SIZE), b""):
+            checksum.update(block)
+
+    return checksum.hexdigest()
+
+
+class ChunkWriter(object):
+    """
+    File-like object splitting everything written to it into chunk_size
+    (FTP_CHUNK_SIZE by default) .partNN files of filepath, updating an md5 digest
+    of the whole (and of each file, in checksums by filepath) as it goes. With a
+    parity_group, a .parityNN file holding the XOR of every parity_group chunks
+    (zero padded) is also written.
+    """
+
+    def __init__(self, filepath, parity_group=0, chunk_size=None):
+        self.filepath = filepath
+        self.parity_group = parity_group
+        self.chunk_size = chunk_size or FTP_CHUNK_SIZE
+        self.checksum = md5()
+        self.chunk_filepaths = []
+        self.parity_filepaths = []
+        self.checksums = {}
+        self._chunk = None
+        self._chunk_checksum = None
+        self._chunk_remaining = 0
+        self._parity = bytearray(self.chunk_size)
+        self._parity_count = 0
+
+    def _end_chunk(self):
+        if self._chunk is None:
+            return
+        self._chunk.close()
+        self._chunk = None
+        self.checksums[self.chunk_filepaths[-1]] = self._chunk_checksum.hexdigest()
+        if self.parity_group:
+            self._parity_count += 1
+            if self._parity_count == self.parity_group:
+                self._end_parity()
+
+    def _end_parity(self):
+        parity_filepath = "{0}.partialparity{1}".format(
+            self.filepath, len(self.parity_filepaths)
+        )
+        self.parity_filepaths.append(parity_filepath)
+        parity = bytes(self._parity)
+        with open(parity_filepath, "wb") as fo:
+            fo.write(parity)
+        self.checksums[parity_filepath] = md5(parity).hexdigest()
+        self._parity = bytearray(self.chunk_size)
+        self._parity_count = 0
+
+    def _next_chunk(self):
+        self._end_chunk()
+        # Renamed on close, the number of parts sets the index width
+        chunk_filepath = "{0}.partial{1}".format(
+            self.filepath, len(self.chunk_filepaths)
+        )
+        self.chunk_filepaths.append(chunk_filepath)
+        self._chunk = open(chunk_filepath, "wb")
+        self._chunk_checksum = md5()
+        self._chunk_remaining = self.chunk_size
+
+    def write(self, data):
+        self.checksum.update(data)
+        while data:
+            if not self._chunk_remaining:
+                self._next_chunk()
+            n = min(len(data), self._chunk_remaining)
+            self._chunk.write(data[:n])
+            self._chunk_checksum.update(data[:n])
+            if self.parity_group:
+                # Short chunks are zero padded, which leaves the parity as is
+                offset = self.chunk_size - self._chunk_remaining
+                for i, byte in enumerate(bytearray(data[:n]), offset):
+                    self._parity[i] ^= byte
+            data = data[n:]
+            self._chunk_remaining -= n
 
-    return checksum
+    def _rename(self, partial_filepaths, kind):
+        fmt = "{0}." + kind + "{1:0" + str(len(str(len(partial_filepaths)))) + "d}"
+        for i, partial_filepath in enumerate(partial_filepaths):
+            partial_filepaths[i] = fmt.format(self.filepath, i)
+            os.rename(partial_filepath, partial_filepaths[i])
+            self.checksums[partial_filepaths[i]] = self.checksums.pop(partial_filepath)
 
+    def discard(self):
+        """
+        Remove the files written so far, partial or not
+        """
+        if self._chunk is not None:
+            self._chunk.close()
+            self._chunk = None
+        for filepath in self.chunk_filepaths + self.parity_filepaths:
+            if os.path.exists(filepath):
+                os.remove(filepath)
 
-def chunk_file(filepath, output_dir):
-    filename = os.path.basename(filepath)
-    n = int(ceil(os.path.getsize(filepath) / float(FTP_CHUNK_SIZE)))
-    chunk_filepaths = []
-    n_len = len(str(n))
+    def close(self):
+        self._end_chunk()
+        if self._parity_count:
+            self._end_parity()
+
+        self._rename(self.chunk_filepaths, "part")
+        self._rename(self.parity_filepaths, "parity")
+
+        return self.chunk_filepaths
+
+
+def chunk_file(filepath, output_dir, chunk_size=None):
+    writer = ChunkWriter(
+        os.path.join(output_dir, os.path.basename(filepath)), chunk_size=chunk_size
+    )
     with open(filepath, "rb") as fi:
-        for i in range(n):
-            fmt = ".part{0:0" + str(n_len) + "d}"
-            chunk_filepath = os.path.join(output_dir, filename + fmt.format(i))
-            chunk_filepaths.append(chunk_filepath)
-            with open(chunk_filepath, "wb") as fo:
-                fo.write(fi.read(FTP_CHUNK_SIZE))
+        for block in iter(lambda: fi.read(writer.chunk_size), b""):
+            writer.write(block)
 
-    return chunk_filepaths
+    return writer.close()
+
+
+def chunk_tarball(
+    filepaths,
+    tarball_filepath,
+    parity_group=FTP_PARITY_GROUP,
+    chunk_size=None,
+    compression="gz",
+):
+    """
+    Chunk a tarball of filepaths as it is compressed, the tarball itself is
+    never written. Streamed tarballs use the compression's default level.
+    Returns the chunk filepaths, parity chunk filepaths, the tarball md5 checksum
+    and the md5 checksums of the chunk and parity files by filepath.
+    """
+    writer = ChunkWriter(tarball_filepath, parity_group, chunk_size)
+    try:
+        with closing(
+            tarfile.open(tarball_filepath, "w|" + compression, fileobj=writer)
+        ) as tar:
+            for filepath in filepaths:
+                tar.add(filepath, arcname=os.path.basename(filepath))
+        writer.close()
+    except Exception:
+        # Don't leave chunks of a broken tarball on the SD card
+        writer.discard()
+        raise
+
+    return (
+        writer.chunk_filepaths,
+        writer.parity_filepaths,
+        writer.checksum.hexdigest(),
+        writer.checksums,
+    )
 
 
-def make_chunk_joiner(chunk_filepaths, checksum):
+def make_chunk_joiner(
+    chunk_filepaths,
+    checksum,
+    parity_filepaths=(),
+    parity_group=FTP_PARITY_GROUP,
+    chunk_size=None,
+):
     original_filename = os.path.basename(chunk_filepaths[0].split(".part")[0])
     with open(JOINER_TEMPLATE, "r") as f:
         template = f.read()
 
     chunk_filenames = [os.path.basename(filepath) for filepath in chunk_filepaths]
+    parity_filenames = [os.path.basename(filepath) for filepath in parity_filepaths]
+    size = sum(os.path.getsize(filepath) for filepath in chunk_filepaths)
     rendered = (
         template.replace("{{original_filename}}", original_filename)
         .replace("{{correct_checksum}}", checksum)
         .replace("{{chunk_filenames}}", repr(chunk_filenames))
-        .replace("{{chunk_size}}", str(FTP_CHUNK_SIZE))
+        .replace("{{chunk_size}}", str(chunk_size or FTP_CHUNK_SIZE))
+        .replace("{{parity_filenames}}", repr(parity_filenames))
+        .replace("{{parity_group}}", str(parity_group if parity_filenames else 0))
+        .replace("{{original_size}}", str(size))
     )
 
     joiner_filepath = os.path.join(
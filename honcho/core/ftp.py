@@ -13,8 +13,27 @@ from honcho.util import get_creds
 logger = logging.getLogger(__name__)
 
 
+_session = None
+
+
 @contextmanager
 def ftp_session():
+    """
+    Powered, logged in FTP session. Sessions opened within another share it, so
+    tasks run together in a comms window only power up and dial out once.
+    """
+    global _session
+    if _session is not None:
+        directory = _session.pwd()
+        try:
+            yield _session
+        finally:
+            try:
+                _session.cwd(directory)
+            except Exception:
+                logger.debug("Restoring FTP directory failed")
+        return
+
     with powered([GPIO.IRD, GPIO.RTR, GPIO.HUB]):
         logger.debug(
             "Waiting {0} seconds before attempting ftp session".format(DIALOUT_WAIT)
@@ -25,7 +44,11 @@ def ftp_session():
             try:
                 with closing(FTP(FTP_HOST, timeout=FTP_TIMEOUT)) as ftp:
                     ftp.login(*get_creds(FTP_HOST))
-                    yield ftp
+                    _session = ftp
+                    try:
+                        yield ftp
+                    finally:
+                        _session = None
                     break
             except socket.error:
                 logger.debug(traceback.format_exc())
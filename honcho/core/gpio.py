@@ -1,50 +1,111 @@
 import logging
 from contextlib import contextmanager
+from time import sleep, time
 
-from honcho.config import (GPIO, GPIO_CONFIG, HUB_ALWAYS_ON, POWER_DATA_DEVICE,
-                           POWER_INDEX_DEVICE)
+from honcho.config import (GPIO, GPIO_CONFIG, GPIO_KEEP_WARM, HUB_ALWAYS_ON,
+                           POWER_DATA_DEVICE, POWER_INDEX_DEVICE)
 
 logger = logging.getLogger(__name__)
 
+# In-process power state, components referenced by open powered() contexts, when each
+# came on and until when an unreferenced component is kept warm
+_references = {}
+_on_since = {}
+_hold_until = {}
+
+# Shadow copy of the power registers by index, refreshed on every read-modify-write
+_registers = {}
+
 
 def _set_index(index):
     with open(POWER_INDEX_DEVICE, "wb") as f:
         f.write(hex(index))
 
 
-def _get_value(index):
+def _read_register(index):
     _set_index(index)
     with open(POWER_DATA_DEVICE, "rb") as f:
-        return int(f.read().strip(), 16)
+        value = int(f.read().strip(), 16)
+    _registers[index] = value
 
+    return value
 
-def _set_mask(index, mask):
-    value = _get_value(index)
-    new_value = value | mask
 
-    _set_index(index)
+def _write_register(index, value):
+    """
+    Write value to register, index must already be selected by _read_register
+    """
     with open(POWER_DATA_DEVICE, "wb") as f:
-        f.write(hex(new_value))
+        f.write(hex(value))
+    _registers[index] = value
 
 
-def _unset_mask(index, mask):
-    value = _get_value(index)
-    new_value = value & ~mask
+def _get_value(index):
+    if index not in _registers:
+        return _read_register(index)
+
+    return _registers[index]
+
+
+def _update_register(index, set_mask=0, unset_mask=0):
+    """
+    Read-modify-write of register, returns the value read before the update
+    """
+    value = _read_register(index)
+    new_value = (value | set_mask) & ~unset_mask
+    if new_value != value:
+        _write_register(index, new_value)
+
+    return value
 
-    _set_index(index)
-    with open(POWER_DATA_DEVICE, "wb") as f:
-        f.write(hex(new_value))
+
+def _set_mask(index, mask):
+    _update_register(index, set_mask=mask)
+
+
+def _unset_mask(index, mask):
+    _update_register(index, unset_mask=mask)
+
+
+def switch(on=(), off=()):
+    """
+    Turn components on and off with one read-modify-write per register
+    """
+    masks = {}
+    for component in on:
+        index_masks = masks.setdefault(GPIO_CONFIG[component]["index"], [0, 0])
+        index_masks[0] |= GPIO_CONFIG[component]["mask"]
+    for component in off:
+        index_masks = masks.setdefault(GPIO_CONFIG[component]["index"], [0, 0])
+        index_masks[1] |= GPIO_CONFIG[component]["mask"]
+
+    previous = {}
+    for index, (set_mask, unset_mask) in sorted(masks.items()):
+        previous[index] = _update_register(index, set_mask, unset_mask)
+
+    now = time()
+    for component in on:
+        if previous[GPIO_CONFIG[component]["index"]] & GPIO_CONFIG[component]["mask"]:
+            # On time unknown if powered outside this process, assume just now
+            _on_since.setdefault(component, now)
+        else:
+            _on_since[component] = now
+    for component in off:
+        _on_since.pop(component, None)
 
 
 def turn_on(component):
-    _set_mask(GPIO_CONFIG[component]["index"], GPIO_CONFIG[component]["mask"])
+    switch(on=[component])
 
 
 def turn_off(component):
-    _unset_mask(GPIO_CONFIG[component]["index"], GPIO_CONFIG[component]["mask"])
+    switch(off=[component])
 
 
 def is_on(component):
+    """
+    Component state from the shadow registers
+    """
     index = GPIO_CONFIG[component]["index"]
     mask = GPIO_CONFIG[component]["mask"]
     value = _get_value(index)
@@ -53,28 +114,90 @@ def is_on(component):
     return result
 
 
+def refresh():
+    for index in set(config["index"] for config in GPIO_CONFIG.values()):
+        _read_register(index)
+
+
 def list():
+    refresh()
     for component in GPIO:
         print("{0}: {1}".format(component, "ON" if is_on(component) else "OFF"))
 
 
-@contextmanager
-def powered(components):
+def acquire(components):
     for component in components:
+        _references[component] = _references.get(component, 0) + 1
         if is_on(component):
             logger.debug("Already on: {0}".format(component))
         else:
             logger.debug("Turning on: {0}".format(component))
-            turn_on(component)
+    # Registers are re-read by the write so components turned off elsewhere come back
+    switch(on=components)
+
+
+def release(components, keep_warm=None):
+    for component in components:
+        if component not in _references:
+            # Already turned off by all_off
+            continue
+        _references[component] -= 1
+        hold = GPIO_KEEP_WARM.get(component, 0) if keep_warm is None else keep_warm
+        if hold:
+            _hold_until[component] = max(_hold_until.get(component, 0), time() + hold)
+
+    release_idle()
+
+
+def release_idle(force=False):
+    """
+    Turn off components no longer referenced whose keep warm hold has expired (or all
+    unreferenced if force)
+    """
+    now = time()
+    off = []
+    for component, references in _references.items():
+        if references > 0:
+            continue
+        if not force and _hold_until.get(component, 0) > now:
+            logger.debug("Keeping warm: {0}".format(component))
+            continue
+
+        del _references[component]
+        _hold_until.pop(component, None)
+        if component == GPIO.HUB and HUB_ALWAYS_ON:
+            logger.debug("Leaving on: {0}".format(component))
+            continue
+        logger.debug("Turning off {0}".format(component))
+        off.append(component)
+
+    if off:
+        switch(off=off)
+
+
+def warm_up(components, seconds):
+    """
+    Sleep until all components have been on for seconds
+    """
+    now = time()
+    elapsed = min(now - _on_since.get(component, now) for component in components)
+    remaining = max(seconds - elapsed, 0)
+    logger.debug("Sleeping {0:.0f} seconds for warm up".format(remaining))
+    sleep(remaining)
+
+
+@contextmanager
+def powered(components, keep_warm=None):
+    """
+    Power components for the duration of the context. Components shared with an
+    enclosing context stay on until the last one exits, and are held on for keep_warm
+    seconds (default GPIO_KEEP_WARM) after that for reuse.
+    """
+    acquire(components)
     try:
         yield
     finally:
-        for component in components:
-            if component == GPIO.HUB and HUB_ALWAYS_ON:
-                logger.debug("Leaving on: {0}".format(component))
-                continue
-            logger.debug("Turning off {0}".format(component))
-            turn_off(component)
+        release(components, keep_warm)
 
 
 def set_awake_gpio_state():
@@ -85,3 +208,6 @@ def set_awake_gpio_state():
 def all_off():
     for index in range(3):
         _unset_mask(index, 255)
+    _references.clear()
+    _on_since.clear()
+    _hold_until.clear()
@@ -7,7 +7,7 @@ from serial import Serial
 
 from honcho.config import (GPIO, IMM_BAUD, IMM_COMMAND_TIMEOUT, IMM_PORT,
                            IMM_SHUTDOWN_WAIT, IMM_STARTUP_WAIT)
-from honcho.core.gpio import powered
+from honcho.core.gpio import powered, warm_up
 from honcho.util import serial_request
 
 logger = getLogger(__name__)
@@ -21,7 +21,7 @@ REMOTE_RESPONSE_END = (
 @contextmanager
 def imm_components():
     with powered([GPIO.SER, GPIO.IMM]):
-        sleep(IMM_STARTUP_WAIT)
+        warm_up([GPIO.SER, GPIO.IMM], IMM_STARTUP_WAIT)
         yield
 
 
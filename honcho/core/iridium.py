@@ -1,10 +1,11 @@
 import logging
 import re
+from struct import pack
 from time import sleep
 
 from honcho.config import (IRD_DEFAULT_TIMEOUT, SBD_MAX_SIZE, SBD_TRANSMISSION_TIMEOUT,
                            SBD_WRITE_TIMEOUT)
-from honcho.util import serial_request
+from honcho.util import serial_request, serial_response
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +66,39 @@ def send_sbd(serial, message):
         raise Exception("SBD write command returned error status")
     sleep(3)
 
+    initiate_session(serial)
+
+
+def send_sbd_binary(serial, message):
+    clear_mo_buffer(serial)
+    sleep(1)
+
+    size = len(message)
+    assert size <= SBD_MAX_SIZE, "Message is too large: {0} > {1}".format(
+        size, SBD_MAX_SIZE
+    )
+
+    # Initiate write binary
+    expected = "READY\r\n"
+    serial_request(
+        serial, "AT+SBDWB={0}".format(size), expected, timeout=IRD_DEFAULT_TIMEOUT
+    )
+
+    # Submit message followed by 2 byte checksum
+    expected = r"(?P<status>\d)" + re.escape("\r\n\r\n") + r"OK" + re.escape("\r\n")
+    checksum = sum(bytearray(message)) & 0xFFFF
+    serial.flushInput()
+    serial.write(message + pack(">H", checksum))
+    response = serial_response(serial, expected, timeout=SBD_WRITE_TIMEOUT)
+    status = int(re.search(expected, response).groupdict()["status"])
+    if status:
+        raise Exception("SBD write binary command returned error status")
+    sleep(3)
+
+    initiate_session(serial)
+
+
+def initiate_session(serial):
     # Initiate transfer to GSS
     expected = (
         re.escape("+SBDIX: ")
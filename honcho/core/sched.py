@@ -1,19 +1,94 @@
+import datetime as datetime_module
+import json
 import logging
-from datetime import datetime
+import os
+import sys
+import types
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from time import sleep
 
-from honcho.config import (MAX_SYSTEM_SLEEP, MODE, MODES, SCHEDULE_IDLE_CHECK_INTERVAL,
-                           SCHEDULE_NAMES, SCHEDULE_START_TIMES, SCHEDULES)
-from honcho.core.gpio import set_awake_gpio_state
+from honcho.config import (EXECUTION_LOG_FILEPATH, MAX_SYSTEM_SLEEP, MODE, MODES,
+                           SCHEDULE_EXACT_WAKEUP, SCHEDULE_IDLE_CHECK_INTERVAL,
+                           SCHEDULE_NAMES, SCHEDULE_SIMULATED_RUNTIME,
+                           SCHEDULE_START_TIMES, SCHEDULES, STANDBY_LATENCY_WEIGHT,
+                           STANDBY_RESUME_LATENCY)
+from honcho.core.gpio import release_idle, set_awake_gpio_state
 from honcho.core.system import get_ps, system_standby
 from honcho.logs import init_logging
 from honcho.tasks import import_task
 from honcho.tasks.power import voltage_check
-from honcho.util import ensure_all_dirs
+from honcho.util import ensure_all_dirs, total_seconds
 from schedule.schedule import Scheduler
 
 logger = logging.getLogger(__name__)
 
+SimulatedRun = namedtuple("SimulatedRun", ("task", "scheduled", "start", "end"))
+
+
+class Clock(object):
+    """
+    Wall clock time, sleeping and standby of the station
+    """
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        sleep(seconds)
+
+    def standby(self, minutes):
+        release_idle(force=True)
+        system_standby(minutes)
+
+
+class VirtualClock(Clock):
+    """
+    Clock that jumps ahead instead of sleeping, standbys are recorded as
+    (start, end) windows instead of entered
+    """
+
+    def __init__(self, start, resume_latency=0):
+        self.current = start
+        self.resume_latency = resume_latency
+        self.standbys = []
+
+    def now(self):
+        return self.current
+
+    def sleep(self, seconds):
+        self.current += timedelta(seconds=seconds)
+
+    def standby(self, minutes):
+        start = self.current
+        self.sleep(minutes * 60 + self.resume_latency)
+        self.standbys.append((start, self.current))
+
+
+@contextmanager
+def scheduler_clock(clock):
+    """
+    Have the schedule library read the time from clock instead of the system
+    """
+    module = sys.modules[Scheduler.__module__]
+
+    class ClockDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock.now()
+
+    clock_datetime_module = types.ModuleType("datetime")
+    clock_datetime_module.__dict__.update(vars(datetime_module))
+    clock_datetime_module.datetime = ClockDatetime
+
+    original = module.datetime
+    module.datetime = clock_datetime_module
+    try:
+        yield
+    finally:
+        module.datetime = original
+
 
 def select_schedule(date):
     if MODE in (MODES.SAFE, MODES.TEST, MODES.SUMMER, MODES.WINTER):
@@ -37,21 +112,185 @@ def select_schedule(date):
         raise Exception("Unexpected MODE: {0}".format(MODE))
 
 
-def load_schedule(scheduler, config):
+def load_schedule(scheduler, config, get_execute=None):
     for spec, task_module in config:
-        task = import_task(task_module)
-        task.execute.__name__ = task_module
+        if get_execute is None:
+            execute = import_task(task_module).execute
+        else:
+            execute = get_execute(task_module)
+        execute.__name__ = task_module
         try:
-            eval(spec).do(task.execute)
+            eval(spec).do(execute)
         except (SyntaxError, NameError):
             continue
 
 
-def idle_check(scheduler):
+def idle_check(scheduler, clock):
     idle_minutes = scheduler.idle_seconds / 60.0
     if idle_minutes > 2:
         logger.info("Schedule idle for {0:.0f} minutes".format(idle_minutes))
-        system_standby(min(int(idle_minutes - 1), MAX_SYSTEM_SLEEP))
+        clock.standby(min(int(idle_minutes - 1), MAX_SYSTEM_SLEEP))
+
+
+def run_schedule(scheduler, clock, check_voltage=voltage_check, until=None):
+    while until is None or clock.now() < until:
+        clock.sleep(SCHEDULE_IDLE_CHECK_INTERVAL)
+        if not check_voltage():
+            continue
+
+        scheduler.run_pending()
+        release_idle()
+        idle_check(scheduler, clock)
+
+
+def wait_for_next_job(scheduler, clock, resume_latency):
+    """
+    Standby whole minutes (MAX_SYSTEM_SLEEP at a time), each ending resume_latency
+    seconds early, then sleep the rest of the time until the next job is due.
+    Returns the resume latency estimate updated from how late standbys resumed.
+    """
+    idle_seconds = scheduler.idle_seconds
+    standby_minutes = min(int((idle_seconds - resume_latency) // 60), MAX_SYSTEM_SLEEP)
+    while standby_minutes > 0:
+        logger.info("Schedule idle for {0:.0f} seconds".format(idle_seconds))
+        resumed_by = clock.now() + timedelta(minutes=standby_minutes)
+        clock.standby(standby_minutes)
+        late_seconds = total_seconds(clock.now() - resumed_by)
+        if late_seconds >= 0:
+            resume_latency += STANDBY_LATENCY_WEIGHT * (late_seconds - resume_latency)
+        else:
+            # Standby skipped or cut short
+            clock.sleep(-late_seconds)
+        idle_seconds = scheduler.idle_seconds
+        standby_minutes = min(
+            int((idle_seconds - resume_latency) // 60), MAX_SYSTEM_SLEEP
+        )
+
+    if idle_seconds > 0:
+        clock.sleep(idle_seconds)
+
+    return resume_latency
+
+
+def run_schedule_exact(scheduler, clock, check_voltage=voltage_check, until=None):
+    resume_latency = STANDBY_RESUME_LATENCY
+    while until is None or clock.now() < until:
+        resume_latency = wait_for_next_job(scheduler, clock, resume_latency)
+        if not check_voltage():
+            # Jobs stay due, back off rather than check again straight away
+            clock.sleep(SCHEDULE_IDLE_CHECK_INTERVAL)
+            continue
+
+        scheduler.run_pending()
+        release_idle()
+
+
+def load_runtimes(config, log_dir=None):
+    """
+    Average successful runtime in seconds of each scheduled task, from the task
+    execution logs in log_dir (ARCHIVE_DIR by default)
+    """
+    runtimes = {}
+    for _, task_module in config:
+        filepath = EXECUTION_LOG_FILEPATH("honcho.tasks.{0}".format(task_module))
+        if log_dir is not None:
+            filepath = os.path.join(log_dir, os.path.basename(filepath))
+        if not os.path.exists(filepath):
+            continue
+        with open(filepath, "r") as f:
+            log_data = json.load(f)
+        if "success_runtime" in log_data:
+            runtimes[task_module] = log_data["success_runtime"]
+
+    return runtimes
+
+
+def get_hourly_seconds(windows):
+    hourly_seconds = [0] * 24
+    for start, end in windows:
+        while start < end:
+            hour_end = start.replace(minute=0, second=0, microsecond=0) + timedelta(
+                hours=1
+            )
+            stop = min(end, hour_end)
+            hourly_seconds[start.hour] += total_seconds(stop - start)
+            start = stop
+
+    return hourly_seconds
+
+
+def simulate(name, start, days, runtimes, exact=SCHEDULE_EXACT_WAKEUP):
+    """
+    Replay a schedule on a virtual clock, each task taking its runtime (or
+    SCHEDULE_SIMULATED_RUNTIME) seconds
+    """
+    clock = VirtualClock(start, STANDBY_RESUME_LATENCY)
+    run_loop = run_schedule_exact if exact else run_schedule
+    end = start + timedelta(days=days)
+    scheduler = Scheduler()
+    runs = []
+
+    def get_execute(task_module):
+        def execute():
+            job = [job for job in scheduler.jobs if job.job_func.func is execute][0]
+            run_start = clock.now()
+            clock.sleep(runtimes.get(task_module, SCHEDULE_SIMULATED_RUNTIME))
+            runs.append(SimulatedRun(task_module, job.next_run, run_start, clock.now()))
+
+        return execute
+
+    # Skip per check logging, a month of schedule is ~100k checks
+    logging.disable(logging.INFO)
+    try:
+        with scheduler_clock(clock):
+            load_schedule(scheduler, SCHEDULES[name], get_execute)
+            run_loop(scheduler, clock, check_voltage=lambda: True, until=end)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    awake_windows = []
+    awake_start = start
+    for standby_start, standby_end in clock.standbys:
+        awake_windows.append((awake_start, min(standby_start, end)))
+        awake_start = standby_end
+    awake_windows.append((awake_start, min(clock.now(), end)))
+
+    overlaps = [
+        (previous, run)
+        for previous, run in zip(runs, runs[1:])
+        if run.scheduled < previous.end
+    ]
+
+    return {
+        "name": name,
+        "days": days,
+        "runs": runs,
+        "standbys": len(clock.standbys),
+        "hourly_awake_seconds": [
+            seconds / float(days) for seconds in get_hourly_seconds(awake_windows)
+        ],
+        "overlaps": overlaps,
+    }
+
+
+def print_simulation(result):
+    print(
+        "Schedule: {0}, {1} days, {2} task runs, {3} standbys".format(
+            result["name"], result["days"], len(result["runs"]), result["standbys"]
+        )
+    )
+    print("Average awake minutes per hour:")
+    for hour, seconds in enumerate(result["hourly_awake_seconds"]):
+        print("{0:02d}:00 {1:5.1f}".format(hour, seconds / 60.0))
+    print(
+        "Total awake minutes per day: {0:.1f}".format(
+            sum(result["hourly_awake_seconds"]) / 60.0
+        )
+    )
+    print("Overlapping jobs: {0}".format(len(result["overlaps"])))
+    pairs = Counter((previous.task, run.task) for previous, run in result["overlaps"])
+    for (previous_task, task), count in sorted(pairs.items()):
+        print("{0} due while {1} running: {2}".format(task, previous_task, count))
 
 
 def print_summary():
@@ -80,14 +319,10 @@ def execute():
     scheduler = Scheduler()
 
     load_schedule(scheduler, SCHEDULES[name])
-
-    while True:
-        sleep(SCHEDULE_IDLE_CHECK_INTERVAL)
-        if not voltage_check():
-            continue
-
-        scheduler.run_pending()
-        idle_check(scheduler)
+    if SCHEDULE_EXACT_WAKEUP:
+        run_schedule_exact(scheduler, Clock())
+    else:
+        run_schedule(scheduler, Clock())
 
 
 if __name__ == "__main__":
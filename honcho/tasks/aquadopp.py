@@ -162,20 +162,26 @@ def parse_sample_list(raw):
     return ids
 
 
-def get_recent_samples(device_ids, n=AQUADOPP_RECENT_SAMPLES):
+def poll_recent_samples(serial, device_ids, n=AQUADOPP_RECENT_SAMPLES):
     samples = []
+    for device_id in device_ids:
+        if n == 1:
+            raw = query_last_sample(serial, device_id)
+            samples.append(parse_sample(device_id, raw))
+        else:
+            raw = query_sample_list(serial, device_id)
+            sample_list = parse_sample_list(raw)
+            for sample_id in sample_list[-n:]:
+                raw = query_sample(serial, device_id, sample_id)
+                samples.append(parse_sample(device_id, raw))
+
+    return samples
+
+
+def get_recent_samples(device_ids, n=AQUADOPP_RECENT_SAMPLES):
     with imm_components():
         with active_line() as serial:
-            for device_id in device_ids:
-                if n == 1:
-                    raw = query_last_sample(serial, device_id)
-                    samples.append(parse_sample(device_id, raw))
-                else:
-                    raw = query_sample_list(serial, device_id)
-                    sample_list = parse_sample_list(raw)
-                    for sample_id in sample_list[-n:]:
-                        raw = query_sample(serial, device_id, sample_id)
-                        samples.append(parse_sample(device_id, raw))
+            samples = poll_recent_samples(serial, device_ids, n)
 
     return samples
 
@@ -184,10 +190,14 @@ def print_samples(samples):
     data.print_samples(samples, CONVERSION_TO_STRING)
 
 
-@task
-def execute():
-    samples = get_recent_samples(device_ids=AQUADOPP_IDS, n=AQUADOPP_RECENT_SAMPLES)
+def log_samples(samples):
     for sample in samples:
         serialized = data.serialize(sample, CONVERSION_TO_STRING)
         data.log_serialized(serialized, DATA_TAGS.AQD)
         queue_sbd(serialized, DATA_TAGS.AQD)
+
+
+@task
+def execute():
+    samples = get_recent_samples(device_ids=AQUADOPP_IDS, n=AQUADOPP_RECENT_SAMPLES)
+    log_samples(samples)
@@ -1,27 +1,41 @@
 import os
 import shutil
+import tempfile
 from datetime import datetime
 from logging import getLogger
 
-from honcho.config import (ARCHIVE_DIR, DATA_DIR, DATA_LOG_FILENAME, DATA_TAGS, LOG_DIR,
-                           TIMESTAMP_FILENAME_FMT, UPLOAD_QUEUE_DIR)
+from honcho.config import (ARCHIVE_CODECS, ARCHIVE_DEFAULT_CODEC, ARCHIVE_DIR, DATA_DIR,
+                           DATA_TAGS, LOG_DIR, TIMESTAMP_FILENAME_FMT)
 from honcho.tasks.common import task
 from honcho.util import clear_directory, make_tarfile
 
 logger = getLogger(__name__)
 
 
-def archive_filepaths(
-    filepaths, prefix=None, postfix=None, output_directory=ARCHIVE_DIR
-):
+CODEC_EXTENSIONS = {"gz": ".tgz", "bz2": ".tbz2", "": ".tar"}
+BENCHMARK_CODECS = (("", None), ("gz", 1), ("gz", 6), ("gz", 9), ("bz2", 9))
+
+
+def get_codec(tag):
+    return ARCHIVE_CODECS.get(tag, ARCHIVE_DEFAULT_CODEC)
+
+
+def archive_filename(prefix=None, postfix=None):
     name = datetime.now().strftime(TIMESTAMP_FILENAME_FMT)
     if prefix is not None:
         name = prefix + "_" + name
     if postfix is not None:
         name += "_" + postfix
-    name += ".tgz"
-    output_filepath = os.path.join(output_directory, name)
-    make_tarfile(output_filepath, filepaths)
+
+    compression, _ = get_codec(postfix)
+    return name + CODEC_EXTENSIONS[compression]
+
+
+def archive_filepaths(
+    filepaths, prefix=None, postfix=None, output_directory=ARCHIVE_DIR
+):
+    output_filepath = os.path.join(output_directory, archive_filename(prefix, postfix))
+    make_tarfile(output_filepath, filepaths, *get_codec(postfix))
 
     return output_filepath
 
@@ -50,12 +64,71 @@ def archive_logs():
         logger.debug("No logs to archive")
 
 
+def cpu_seconds():
+    user, system = os.times()[:2]
+    return user + system
+
+
+def benchmark_codecs(tags=DATA_TAGS, codecs=BENCHMARK_CODECS):
+    """
+    Compression ratio and CPU seconds of each codec archiving the files waiting
+    in each tag's data directory
+    """
+    results = []
+    output_directory = tempfile.mkdtemp()
+    try:
+        for tag in tags:
+            data_dir = DATA_DIR(tag)
+            filepaths = [
+                os.path.join(data_dir, filename) for filename in os.listdir(data_dir)
+            ]
+            size = sum(os.path.getsize(filepath) for filepath in filepaths)
+            if not size:
+                continue
+            for compression, compresslevel in codecs:
+                output_filepath = os.path.join(output_directory, tag)
+                start = cpu_seconds()
+                make_tarfile(output_filepath, filepaths, compression, compresslevel)
+                results.append(
+                    (
+                        tag,
+                        compression,
+                        compresslevel,
+                        size,
+                        float(size) / os.path.getsize(output_filepath),
+                        cpu_seconds() - start,
+                    )
+                )
+    finally:
+        shutil.rmtree(output_directory)
+
+    return results
+
+
+def print_benchmark(results):
+    print(
+        "{0:<5} {1:<5} {2:>5} {3:>10} {4:>6} {5:>8}".format(
+            "Tag", "Codec", "Level", "Bytes", "Ratio", "CPU s"
+        )
+    )
+    for tag, compression, compresslevel, size, ratio, seconds in results:
+        print(
+            "{0:<5} {1:<5} {2:>5} {3:>10} {4:>6.2f} {5:>8.2f}".format(
+                tag, compression or "store", compresslevel or "", size, ratio, seconds
+            )
+        )
+
+
 @task
 def execute():
     archive_data()
     archive_logs()
 
-    shutil.copy(DATA_LOG_FILENAME(DATA_TAGS.PWR), UPLOAD_QUEUE_DIR)
+    # Imported here as upload builds on this module
+    from honcho.tasks.upload import queue_log_tails
+
+    # Ship the rest of the append-only logs before they are cleared
+    queue_log_tails()
 
     logger.debug("Cleaning up")
     for tag in DATA_TAGS:
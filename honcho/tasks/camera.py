@@ -1,24 +1,38 @@
+import json
 import os
+import re
 import shutil
 import subprocess
 import xml.etree.ElementTree as ET
+from contextlib import contextmanager
 from datetime import datetime
+from fractions import Fraction
+from itertools import permutations
 from logging import getLogger
 from tempfile import NamedTemporaryFile
-from time import sleep
+from time import sleep, time
 
 import requests
 from requests.auth import HTTPDigestAuth
 
-from honcho.config import (CAMERA_PASSWORD, CAMERA_STARTUP_WAIT, CAMERA_USERNAME,
-                           CJPEG_COMMAND, DATA_DIR, DATA_TAGS, DJPEG_COMMAND, GPIO,
-                           JPEGTRAN_COMMAND, LOOK_PTZ, LOOK_SERIES, ONVIF_TEMPLATE_DIR,
-                           ONVIF_TEMPLATE_FILES, PTZ, PTZ_SERVICE_URL, SNAPSHOP_URL,
-                           SOAP_ACTION_KEYS, SOAP_ACTIONS, TIMESTAMP_FILENAME_FMT)
-from honcho.core.gpio import powered
+from honcho.config import (CAMERA_CHANGE_THRESHOLD, CAMERA_DARK_LUMINANCE,
+                           CAMERA_FINGERPRINT_SIZE, CAMERA_FINGERPRINTS_FILEPATH,
+                           CAMERA_MAX_QUALITY, CAMERA_MAX_TARGET_BYTES,
+                           CAMERA_MIN_QUALITY, CAMERA_MIN_TARGET_BYTES, CAMERA_PASSWORD,
+                           CAMERA_PIPELINE, CAMERA_SCALE_LADDER, CAMERA_STARTUP_WAIT,
+                           CAMERA_THUMBNAIL_SCALE, CAMERA_USERNAME, CJPEG_COMMAND,
+                           DATA_DIR, DATA_TAGS, DJPEG_COMMAND, GPIO, JPEGTRAN_COMMAND,
+                           LOOK_PTZ, LOOK_SERIES, ONVIF_TEMPLATE_DIR,
+                           ONVIF_TEMPLATE_FILES, PTZ, PTZ_POLL_INTERVAL,
+                           PTZ_SERVICE_URL, PTZ_SETTLE_TIMEOUT, PTZ_TOLERANCE,
+                           SNAPSHOP_URL, SNAPSHOT_BLOCK_SIZE, SOAP_ACTION_KEYS,
+                           SOAP_ACTIONS, TIMESTAMP_FILENAME_FMT,
+                           UPLOAD_DEFAULT_PRIORITY, UPLOAD_PRIORITIES,
+                           UPLOAD_SESSION_BYTES)
+from honcho.core.gpio import powered, warm_up
 from honcho.tasks.archive import archive_filepaths
 from honcho.tasks.common import task
-from honcho.tasks.upload import queue_filepaths
+from honcho.tasks.upload import get_priority, get_queue, queue_filepaths
 from honcho.util import clear_directory
 
 logger = getLogger(__name__)
@@ -37,90 +51,199 @@ def ns(tag):
         "Speed",
     ):
         return "{http://www.onvif.org/ver20/ptz/wsdl}" + tag
-    elif tag in ("PanTilt", "Zoom"):
+    elif tag in ("PanTilt", "Zoom", "MoveStatus"):
         return "{http://www.onvif.org/ver10/schema}" + tag
 
 
-def get_ptz():
-    headers = {
-        "SOAPAction": SOAP_ACTIONS[SOAP_ACTION_KEYS.GET_STATUS],
-        "Content-Type": "application/soap+xml",
-    }
+def serialize(value):
+    return "{0}".format(value)
 
-    template_filepath = os.path.join(
-        ONVIF_TEMPLATE_DIR, ONVIF_TEMPLATE_FILES[SOAP_ACTION_KEYS.GET_STATUS]
-    )
-    with open(template_filepath, "r") as f:
-        data = f.read()
 
-    response = requests.post(PTZ_SERVICE_URL, data=data, headers=headers)
+def ptz_distance(a, b):
+    # Axes move at once, so a move takes as long as its largest change
+    return max(abs(a.pan - b.pan), abs(a.tilt - b.tilt), abs(a.zoom - b.zoom))
 
-    root = ET.fromstring(response.content)
 
-    position = root.find(
-        "/".join(
-            [
-                ns("Body"),
-                ns("GetStatusResponse"),
-                ns("PTZStatus"),
-                "{http://www.onvif.org/ver10/schema}Position",
-            ]
+def order_looks(looks, start=None):
+    """
+    Looks in the order with least total PTZ travel from start, ties keep the
+    configured order
+    """
+
+    def travel(order):
+        ptzs = [LOOK_PTZ[look]["ptz"] for look in order]
+        if start is not None:
+            ptzs.insert(0, start)
+        return sum(ptz_distance(a, b) for a, b in zip(ptzs, ptzs[1:]))
+
+    return list(min(permutations(looks), key=travel))
+
+
+class CameraClient(object):
+    """
+    Keep-alive HTTP session to the camera. Digest auth is negotiated on the first
+    snapshot and reused, SOAP templates are parsed once
+    """
+
+    def __init__(self, username=CAMERA_USERNAME, password=CAMERA_PASSWORD):
+        self.session = requests.Session()
+        self.auth = HTTPDigestAuth(username, password)
+        self.templates = {}
+
+    def close(self):
+        self.session.close()
+
+    def template(self, action_key):
+        if action_key not in self.templates:
+            template_filepath = os.path.join(
+                ONVIF_TEMPLATE_DIR, ONVIF_TEMPLATE_FILES[action_key]
+            )
+            self.templates[action_key] = ET.parse(template_filepath).getroot()
+
+        return self.templates[action_key]
+
+    def soap_request(self, action_key, root):
+        headers = {
+            "SOAPAction": SOAP_ACTIONS[action_key],
+            "Content-Type": "application/soap+xml",
+        }
+        return self.session.post(
+            PTZ_SERVICE_URL, data=ET.tostring(root), headers=headers
         )
-    )
-    pan_tilt = position.find(ns("PanTilt"))
-    pan = float(pan_tilt.attrib["x"])
-    tilt = float(pan_tilt.attrib["y"])
 
-    zoom = position.find(ns("Zoom"))
-    zoom = float(zoom.attrib["x"])
+    def get_status(self):
+        """
+        Position, and whether the camera is moving (None if it doesn't report
+        MoveStatus)
+        """
+        response = self.soap_request(
+            SOAP_ACTION_KEYS.GET_STATUS, self.template(SOAP_ACTION_KEYS.GET_STATUS)
+        )
+
+        root = ET.fromstring(response.content)
+
+        position = root.find(
+            "/".join(
+                [
+                    ns("Body"),
+                    ns("GetStatusResponse"),
+                    ns("PTZStatus"),
+                    "{http://www.onvif.org/ver10/schema}Position",
+                ]
+            )
+        )
+        pan_tilt = position.find(ns("PanTilt"))
+        pan = float(pan_tilt.attrib["x"])
+        tilt = float(pan_tilt.attrib["y"])
+
+        zoom = position.find(ns("Zoom"))
+        zoom = float(zoom.attrib["x"])
+
+        moving = None
+        move_status = root.find(
+            "/".join(
+                [
+                    ns("Body"),
+                    ns("GetStatusResponse"),
+                    ns("PTZStatus"),
+                    ns("MoveStatus"),
+                ]
+            )
+        )
+        if move_status is not None:
+            moving = any(
+                (el.text or "").strip().upper() == "MOVING" for el in move_status
+            )
 
-    return PTZ(pan=pan, tilt=tilt, zoom=zoom)
+        return PTZ(pan=pan, tilt=tilt, zoom=zoom), moving
 
+    def get_ptz(self):
+        return self.get_status()[0]
 
-def serialize(value):
-    return "{0}".format(value)
+    def wait_for_ptz(
+        self,
+        target,
+        tolerance=PTZ_TOLERANCE,
+        interval=PTZ_POLL_INTERVAL,
+        timeout=PTZ_SETTLE_TIMEOUT,
+    ):
+        """
+        Poll until the camera stopped within tolerance of target, False on timeout
+        """
+        start = time()
+        while True:
+            sleep(interval)
+            ptz, moving = self.get_status()
+            if not moving and ptz_distance(ptz, target) <= tolerance:
+                logger.debug("Settled after {0:.1f} seconds".format(time() - start))
+                return True
+            if time() - start >= timeout:
+                logger.warning(
+                    "Not settled at {0} after {1} seconds, at {2}".format(
+                        target, timeout, ptz
+                    )
+                )
+                return False
+
+    def set_ptz(self, pan, tilt, zoom):
+        logger.debug("Moving to ptz: {0} {1} {2}".format(pan, tilt, zoom))
+        pan = 0 if pan is None else pan
+        tilt = 0 if tilt is None else tilt
+        zoom = 0 if zoom is None else zoom
+
+        # Every attribute set is overwritten on each move, so the cached template
+        # is updated in place
+        root = self.template(SOAP_ACTION_KEYS.ABSOLUTE_MOVE)
+
+        pan_tilt_el = root.find(
+            "/".join([ns("Body"), ns("AbsoluteMove"), ns("Position"), ns("PanTilt")])
+        )
+        pan_tilt_el.attrib["x"] = serialize(pan)
+        pan_tilt_el.attrib["y"] = serialize(tilt)
+
+        zoom_el = root.find(
+            "/".join([ns("Body"), ns("AbsoluteMove"), ns("Position"), ns("Zoom")])
+        )
+        zoom_el.attrib["x"] = serialize(zoom)
 
+        self.soap_request(SOAP_ACTION_KEYS.ABSOLUTE_MOVE, root)
 
-def set_ptz(pan, tilt, zoom):
-    logger.debug("Moving to ptz: {0} {1} {2}".format(pan, tilt, zoom))
-    pan = 0 if pan is None else pan
-    tilt = 0 if tilt is None else tilt
-    zoom = 0 if zoom is None else zoom
-    headers = {
-        "SOAPAction": SOAP_ACTIONS[SOAP_ACTION_KEYS.ABSOLUTE_MOVE],
-        "Content-Type": "application/soap+xml",
-    }
-
-    template_filepath = os.path.join(
-        ONVIF_TEMPLATE_DIR, ONVIF_TEMPLATE_FILES[SOAP_ACTION_KEYS.ABSOLUTE_MOVE]
-    )
-    tree = ET.parse(template_filepath)
-    root = tree.getroot()
+        self.wait_for_ptz(PTZ(pan=pan, tilt=tilt, zoom=zoom))
 
-    pan_tilt_el = root.find(
-        "/".join([ns("Body"), ns("AbsoluteMove"), ns("Position"), ns("PanTilt")])
-    )
-    pan_tilt_el.attrib["x"] = serialize(pan)
-    pan_tilt_el.attrib["y"] = serialize(tilt)
+    def snapshot(self, filepath, block_size=SNAPSHOT_BLOCK_SIZE):
+        logger.debug("Taking snapshot: {0}".format(filepath))
+        response = self.session.get(SNAPSHOP_URL, auth=self.auth, stream=True)
+        try:
+            response.raise_for_status()
+            with open(filepath, "wb") as f:
+                for block in response.iter_content(block_size):
+                    f.write(block)
+        finally:
+            response.close()
 
-    zoom_el = root.find(
-        "/".join([ns("Body"), ns("AbsoluteMove"), ns("Position"), ns("Zoom")])
-    )
-    zoom_el.attrib["x"] = serialize(zoom)
 
-    data = ET.tostring(root)
-    requests.post(PTZ_SERVICE_URL, data=data, headers=headers)
+@contextmanager
+def camera_client():
+    client = CameraClient()
+    try:
+        yield client
+    finally:
+        client.close()
 
-    sleep(5)
+
+def get_ptz():
+    with camera_client() as client:
+        return client.get_ptz()
+
+
+def set_ptz(pan, tilt, zoom):
+    with camera_client() as client:
+        client.set_ptz(pan, tilt, zoom)
 
 
 def snapshot(filepath):
-    response = requests.get(
-        SNAPSHOP_URL, auth=HTTPDigestAuth(CAMERA_USERNAME, CAMERA_PASSWORD)
-    )
-    logger.debug("Taking snapshot: {0}".format(filepath))
-    with open(filepath, "wb") as f:
-        f.write(response.content)
+    with camera_client() as client:
+        client.snapshot(filepath)
 
 
 def reduce_image(input_filepath, output_filepath, factor):
@@ -158,44 +281,381 @@ def crop_image(input_filepath, output_filepath, crop):
     )
 
 
-@task
-def execute():
-    with powered([GPIO.CAM, GPIO.HUB]):
-        logger.debug(
-            "Sleeping {0} seconds for camera startup".format(CAMERA_STARTUP_WAIT)
+def jpeg_commands(crop=None, scale=None, quality=None):
+    """
+    libjpeg commands that together take a JPEG on stdin to the processed JPEG on
+    stdout. Cropping is lossless (whole iMCUs, no decode), scaling happens in the
+    DCT domain while decoding. Reduced images are progressive, so a truncated
+    upload still shows the whole view
+    """
+    commands = []
+    if crop is not None:
+        commands.append(
+            [
+                JPEGTRAN_COMMAND,
+                "-crop",
+                "{width}x{height}+{x}+{y}".format(**crop._asdict()),
+            ]
+        )
+    if scale is not None:
+        commands.append([DJPEG_COMMAND, "-scale", scale])
+        commands.append(cjpeg_command(quality))
+
+    return commands
+
+
+def cjpeg_command(quality=None):
+    command = [CJPEG_COMMAND, "-progressive"]
+    if quality is not None:
+        command += ["-quality", str(quality)]
+
+    return command
+
+
+def start_pipeline(commands, stdin, stdout):
+    processes = []
+    for i, command in enumerate(commands):
+        process = subprocess.Popen(
+            command,
+            stdin=processes[-1].stdout if processes else stdin,
+            stdout=stdout if i == len(commands) - 1 else subprocess.PIPE,
+        )
+        if processes:
+            # Only the next command reads it, so a failure downstream ends the pipe
+            processes[-1].stdout.close()
+        processes.append(process)
+
+    return processes
+
+
+def wait_pipeline(commands, processes):
+    for command, process in zip(commands, processes):
+        if process.wait():
+            raise subprocess.CalledProcessError(process.returncode, command)
+
+
+def start_process_image(input_filepath, output_filepath, crop=None, scale=None):
+    """
+    Start cropping and reducing input_filepath to output_filepath in one pass, the
+    commands are piped together so no intermediate image touches the SD card.
+    Returns a function waiting for them to finish
+    """
+    commands = jpeg_commands(crop, scale)
+    if not commands:
+        shutil.copy(input_filepath, output_filepath)
+        return lambda: None
+
+    logger.debug("Processing image with crop {0}, scale {1}".format(crop, scale))
+    with open(input_filepath, "rb") as fi, open(output_filepath, "wb") as fo:
+        processes = start_pipeline(commands, fi, fo)
+
+    return lambda: wait_pipeline(commands, processes)
+
+
+def process_image(input_filepath, output_filepath, crop=None, scale=None):
+    start_process_image(input_filepath, output_filepath, crop, scale)()
+
+
+def decode_image(input_filepath, crop, scale):
+    # Cropped and scaled PPM, without the final encode
+    commands = jpeg_commands(crop, scale)[:-1]
+    with open(input_filepath, "rb") as fi:
+        processes = start_pipeline(commands, fi, subprocess.PIPE)
+    decoded = processes[-1].stdout.read()
+    wait_pipeline(commands, processes)
+
+    return decoded
+
+
+def encode_image(decoded, quality):
+    command = cjpeg_command(quality)
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    encoded = process.communicate(decoded)[0]
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+    return encoded
+
+
+def fit_image(input_filepath, output_filepath, crop, scale, target_bytes):
+    """
+    Encode input_filepath to output_filepath at the largest scale down
+    CAMERA_SCALE_LADDER, and then the highest quality, that fits in target_bytes.
+    Each scale is decoded once and its quality binary searched. Returns the scale
+    and quality used
+    """
+    largest = Fraction(scale or "1/1")
+    scales = [scale or "1/1"] + [
+        el for el in CAMERA_SCALE_LADDER if Fraction(el) < largest
+    ]
+    for scale in scales:
+        decoded = decode_image(input_filepath, crop, scale)
+        low, high = CAMERA_MIN_QUALITY, CAMERA_MAX_QUALITY
+        best = None
+        while low <= high:
+            quality = (low + high) // 2
+            encoded = encode_image(decoded, quality)
+            if len(encoded) <= target_bytes:
+                best, low = (encoded, quality), quality + 1
+            else:
+                high = quality - 1
+        if best is not None:
+            break
+    else:
+        logger.warning(
+            "{0} does not fit {1} bytes, using scale {2}, quality {3}".format(
+                input_filepath, target_bytes, scale, CAMERA_MIN_QUALITY
+            )
+        )
+        best = (encode_image(decoded, CAMERA_MIN_QUALITY), CAMERA_MIN_QUALITY)
+
+    encoded, quality = best
+    logger.debug(
+        "Fit {0} bytes at scale {1}, quality {2}".format(len(encoded), scale, quality)
+    )
+    with open(output_filepath, "wb") as f:
+        f.write(encoded)
+
+    return scale, quality
+
+
+def look_target_bytes(n_looks):
+    """
+    Share of the next upload window per look, after what is queued ahead of camera
+    images
+    """
+    now = datetime.now()
+    priority = UPLOAD_PRIORITIES.get(DATA_TAGS.CAM, UPLOAD_DEFAULT_PRIORITY)
+    ahead = sum(
+        os.path.getsize(filepath)
+        for filepath in get_queue()
+        if get_priority(filepath, now) <= priority
+    )
+    target_bytes = max(UPLOAD_SESSION_BYTES - ahead, 0) // n_looks
+
+    return min(max(target_bytes, CAMERA_MIN_TARGET_BYTES), CAMERA_MAX_TARGET_BYTES)
+
+
+def process_image_chained(input_filepath, output_filepath, crop=None, scale=None):
+    shutil.copy(input_filepath, output_filepath)
+    if crop is not None:
+        crop_image(output_filepath, output_filepath, crop)
+    if scale is not None:
+        reduce_image(output_filepath, output_filepath, scale)
+
+
+def benchmark_image_processing(input_filepath, looks=LOOK_SERIES, repeat=3):
+    """
+    Wall and CPU seconds (of the commands run) per image for each look's crop and
+    scale, piped in one pass vs. chained through files
+    """
+    results = []
+    output_filepath = NamedTemporaryFile(suffix=".jpg", delete=False).name
+    try:
+        for look in looks:
+            crop, scale = LOOK_PTZ[look]["crop"], LOOK_PTZ[look]["scale"]
+            for method in (process_image_chained, process_image):
+                start_wall, start_cpu = time(), sum(os.times()[2:4])
+                for _ in xrange(repeat):
+                    method(input_filepath, output_filepath, crop, scale)
+                results.append(
+                    (
+                        look,
+                        method.__name__,
+                        (time() - start_wall) / repeat,
+                        (sum(os.times()[2:4]) - start_cpu) / repeat,
+                        os.path.getsize(output_filepath),
+                    )
+                )
+    finally:
+        os.remove(output_filepath)
+
+    return results
+
+
+def print_image_benchmark(results):
+    print(
+        "{0:<8} {1:<22} {2:>7} {3:>7} {4:>8}".format(
+            "Look", "Method", "Wall s", "CPU s", "Bytes"
         )
-        sleep(CAMERA_STARTUP_WAIT)
-        raw_filepaths, processed_filepaths = [], []
-        for look in LOOK_SERIES:
-            logger.debug("Looking at {0}".format(look))
-            ptz = LOOK_PTZ[look]["ptz"]
-            scale = LOOK_PTZ[look]["scale"]
-            crop = LOOK_PTZ[look]["crop"]
-            set_ptz(**ptz._asdict())
-
-            data_dir = DATA_DIR(DATA_TAGS.CAM)
-
-            timestamp = datetime.now()
-            raw_filename = "{timestamp}_{look}_full.jpg".format(
-                timestamp=timestamp.strftime(TIMESTAMP_FILENAME_FMT), look=look
+    )
+    for look, method, wall, cpu, size in results:
+        print(
+            "{0:<8} {1:<22} {2:>7.2f} {3:>7.2f} {4:>8}".format(
+                look, method, wall, cpu, size
             )
-            raw_filepath = os.path.join(data_dir, raw_filename)
-            snapshot(raw_filepath)
-            raw_filepaths.append(raw_filepath)
+        )
 
-            processed_filename = "{timestamp}_{look}_low.jpg".format(
-                timestamp=timestamp.strftime(TIMESTAMP_FILENAME_FMT), look=look
+
+PGM_HEADER = re.compile(br"P5\s+(\d+)\s+(\d+)\s+(\d+)\s")
+
+
+def image_fingerprint(filepath, size=CAMERA_FINGERPRINT_SIZE):
+    """
+    Mean luminance of a size x size grid over the image, decoded in grayscale at
+    1/8 scale
+    """
+    pgm = subprocess.check_output(
+        [DJPEG_COMMAND, "-scale", "1/8", "-grayscale", "-pnm", filepath]
+    )
+    header = PGM_HEADER.match(pgm)
+    width, height = int(header.group(1)), int(header.group(2))
+    pixels = bytearray(pgm[header.end() :])
+
+    sums, counts = [0] * size * size, [0] * size * size
+    columns = [x * size // width for x in xrange(width)]
+    for y in xrange(height):
+        row = y * size // height * size
+        for x, value in enumerate(pixels[y * width : (y + 1) * width]):
+            sums[row + columns[x]] += value
+            counts[row + columns[x]] += 1
+
+    return [total // count if count else 0 for total, count in zip(sums, counts)]
+
+
+def fingerprint_change(a, b):
+    return float(sum(abs(x - y) for x, y in zip(a, b))) / len(a)
+
+
+def load_fingerprints():
+    if not os.path.exists(CAMERA_FINGERPRINTS_FILEPATH):
+        return {}
+    with open(CAMERA_FINGERPRINTS_FILEPATH, "r") as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            logger.warning("Unreadable fingerprints, starting afresh")
+            return {}
+
+
+def save_fingerprints(fingerprints):
+    # Written aside and renamed, a power cut never leaves a partial file
+    tmp_filepath = CAMERA_FINGERPRINTS_FILEPATH + ".tmp"
+    with open(tmp_filepath, "w") as f:
+        json.dump(fingerprints, f)
+    os.rename(tmp_filepath, CAMERA_FINGERPRINTS_FILEPATH)
+
+
+def select_upload(look, filepath, fingerprints):
+    """
+    filepath if it is bright enough and changed from the last one uploaded for the
+    look, otherwise a thumbnail of it
+    """
+    fingerprint = image_fingerprint(filepath)
+    luminance = float(sum(fingerprint)) / len(fingerprint)
+    previous = fingerprints.get(look)
+    change = fingerprint_change(fingerprint, previous) if previous else None
+    if luminance >= CAMERA_DARK_LUMINANCE and (
+        change is None or change >= CAMERA_CHANGE_THRESHOLD
+    ):
+        fingerprints[look] = fingerprint
+        return filepath
+
+    logger.info(
+        "Queueing thumbnail of {0}, luminance {1:.1f}, change {2}".format(
+            look, luminance, change
+        )
+    )
+    thumbnail_filepath = filepath.replace("_low.jpg", "_thumb.jpg")
+    process_image(filepath, thumbnail_filepath, scale=CAMERA_THUMBNAIL_SCALE)
+
+    return thumbnail_filepath
+
+
+def wait_all(waits):
+    """
+    Wait for all of the started processing, failures are logged and the first is
+    raised once all are done
+    """
+    failed = None
+    for wait in waits:
+        try:
+            wait()
+        except subprocess.CalledProcessError as e:
+            logger.error("Processing image failed: {0}".format(e))
+            if failed is None:
+                failed = e
+    if failed is not None:
+        raise failed
+
+
+def wait_quietly(waits):
+    try:
+        wait_all(waits)
+    except subprocess.CalledProcessError:
+        pass
+
+
+@task
+def execute():
+    looks, raw_filepaths, processed_filepaths, pending = [], [], [], []
+    try:
+        with powered([GPIO.CAM, GPIO.HUB]):
+            logger.debug(
+                "Sleeping {0} seconds for camera startup".format(CAMERA_STARTUP_WAIT)
+            )
+            warm_up([GPIO.CAM, GPIO.HUB], CAMERA_STARTUP_WAIT)
+            with camera_client() as client:
+                for look in order_looks(LOOK_SERIES, client.get_ptz()):
+                    logger.debug("Looking at {0}".format(look))
+                    ptz = LOOK_PTZ[look]["ptz"]
+                    scale = LOOK_PTZ[look]["scale"]
+                    crop = LOOK_PTZ[look]["crop"]
+                    client.set_ptz(**ptz._asdict())
+
+                    data_dir = DATA_DIR(DATA_TAGS.CAM)
+
+                    timestamp = datetime.now()
+                    raw_filename = "{timestamp}_{look}_full.jpg".format(
+                        timestamp=timestamp.strftime(TIMESTAMP_FILENAME_FMT), look=look
+                    )
+                    raw_filepath = os.path.join(data_dir, raw_filename)
+                    client.snapshot(raw_filepath)
+                    raw_filepaths.append(raw_filepath)
+
+                    processed_filename = "{timestamp}_{look}_low.jpg".format(
+                        timestamp=timestamp.strftime(TIMESTAMP_FILENAME_FMT), look=look
+                    )
+                    processed_filepath = os.path.join(data_dir, processed_filename)
+                    # Processed while the camera moves on to the next look
+                    wait = start_process_image(
+                        raw_filepath, processed_filepath, crop, scale
+                    )
+                    if CAMERA_PIPELINE:
+                        pending.append(wait)
+                    else:
+                        wait()
+                    looks.append(look)
+                    processed_filepaths.append(processed_filepath)
+    except Exception:
+        # Don't orphan the processing started before the series failed
+        wait_quietly(pending)
+        raise
+
+    # Camera and hub are powered off, finish processing
+    wait_all(pending)
+
+    target_bytes = look_target_bytes(len(looks))
+    for look, raw_filepath, processed_filepath in zip(
+        looks, raw_filepaths, processed_filepaths
+    ):
+        if os.path.getsize(processed_filepath) > target_bytes:
+            fit_image(
+                raw_filepath,
+                processed_filepath,
+                LOOK_PTZ[look]["crop"],
+                LOOK_PTZ[look]["scale"],
+                target_bytes,
             )
-            processed_filepath = os.path.join(data_dir, processed_filename)
-            shutil.copy(raw_filepath, processed_filepath)
-            processed_filepaths.append(processed_filepath)
 
-            if crop is not None:
-                crop_image(processed_filepath, processed_filepath, crop)
-            if scale is not None:
-                reduce_image(processed_filepath, processed_filepath, scale)
+    fingerprints = load_fingerprints()
+    upload_filepaths = [
+        select_upload(look, filepath, fingerprints)
+        for look, filepath in zip(looks, processed_filepaths)
+    ]
+    save_fingerprints(fingerprints)
 
     tag = DATA_TAGS.CAM
-    queue_filepaths(processed_filepaths, postfix=tag, tarball=False)
+    queue_filepaths(upload_filepaths, postfix=tag, tarball=False)
     archive_filepaths(raw_filepaths, postfix=tag)
     clear_directory(data_dir)
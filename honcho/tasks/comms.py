@@ -0,0 +1,30 @@
+from logging import getLogger
+
+import honcho.tasks.orders as orders
+import honcho.tasks.sbd as sbd
+import honcho.tasks.upload as upload
+from honcho.core.ftp import ftp_session
+from honcho.tasks.common import task
+
+logger = getLogger(__name__)
+
+
+@task
+def execute():
+    """
+    Fetch orders, flush the SBD queue and upload in one comms window, the links
+    are powered and dialed out once for all of them. New tails of append-only
+    logs ride along with the queue. SBD is the fallback when FTP is down, so it
+    is flushed even if the dial-out fails
+    """
+    upload.queue_log_tails()
+    sbd_flushed = False
+    try:
+        with ftp_session():
+            orders.execute()
+            sbd.execute()
+            sbd_flushed = True
+            upload.execute()
+    finally:
+        if not sbd_flushed:
+            sbd.execute()
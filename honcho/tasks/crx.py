@@ -1,11 +1,10 @@
 import logging
 from collections import namedtuple
 from contextlib import contextmanager
-from time import sleep
 
 from honcho.config import CRX_STARTUP_WAIT, CRX_URL, DATA_TAGS, GPIO, TIMESTAMP_FMT
 from honcho.core.data import log_serialized, serialize
-from honcho.core.gpio import powered
+from honcho.core.gpio import powered, warm_up
 from honcho.tasks.common import task
 from honcho.tasks.sbd import queue_sbd
 from pycampbellcr1000 import CR1000
@@ -61,7 +60,7 @@ def connection():
 def get_last_sample():
     with powered([GPIO.HUB, GPIO.CRX]):
         logger.debug("Waiting {0} seconds for crx startup".format(CRX_STARTUP_WAIT))
-        sleep(CRX_STARTUP_WAIT)
+        warm_up([GPIO.HUB, GPIO.CRX], CRX_STARTUP_WAIT)
         with connection() as device:
             logger.debug("Getting last sample from CRX")
             recfrag = device.get_raw_packets("Public")[-1]["RecFrag"][-1]
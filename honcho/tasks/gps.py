@@ -2,14 +2,13 @@ import re
 from collections import namedtuple
 from contextlib import closing
 from datetime import datetime
-from time import sleep
 
 from serial import Serial
 
 import honcho.core.data as data
 from honcho.config import (DATA_TAGS, GPIO, GPS_BAUD, GPS_PORT, GPS_STARTUP_WAIT,
                            TIMESTAMP_FMT)
-from honcho.core.gpio import powered
+from honcho.core.gpio import powered, warm_up
 from honcho.core.system import set_datetime
 from honcho.tasks.common import task
 from honcho.tasks.sbd import queue_sbd
@@ -60,7 +59,7 @@ CONVERSION_TO_STRING = {
     DATA_KEYS.ALTITUDE: "{0:.4f}",
     DATA_KEYS.ALTITUDE_UNITS: "{0}",
     DATA_KEYS.GEOID_SEP: "{0:.4f}",
-    DATA_KEYS.GEOID_SEP_UNITS: "{0:.2f}",
+    DATA_KEYS.GEOID_SEP_UNITS: "{0}",
     DATA_KEYS.REF_ID: "{0}",
     DATA_KEYS.CHECKSUM: "{0:02X}",
 }
@@ -112,7 +111,7 @@ def parse_gga(raw, timestamp):
 
 def get_gga():
     with powered([GPIO.SER, GPIO.GPS]):
-        sleep(GPS_STARTUP_WAIT)
+        warm_up([GPIO.SER, GPIO.GPS], GPS_STARTUP_WAIT)
         with closing(Serial(GPS_PORT, GPS_BAUD, timeout=60)) as serial:
             timestamp = get_datetime(serial)
             set_datetime(timestamp)
@@ -0,0 +1,61 @@
+import traceback
+from logging import getLogger
+
+import honcho.tasks.aquadopp as aquadopp
+import honcho.tasks.seabird as seabird
+from honcho.config import (AQUADOPP_IDS, AQUADOPP_RECENT_SAMPLES, SEABIRD_IDS,
+                           SEABIRD_RECENT_SAMPLES)
+from honcho.core.imm import active_line, imm_components
+from honcho.tasks.common import task
+
+logger = getLogger(__name__)
+
+
+def poll_recent_samples(serial, module, device_ids, n):
+    try:
+        return module.poll_recent_samples(serial, device_ids, n)
+    except Exception:
+        logger.error(
+            "Polling {0} failed:\n{1}".format(module.__name__, traceback.format_exc())
+        )
+
+
+def get_recent_samples(
+    seabird_ids=SEABIRD_IDS,
+    aquadopp_ids=AQUADOPP_IDS,
+    seabird_n=SEABIRD_RECENT_SAMPLES,
+    aquadopp_n=AQUADOPP_RECENT_SAMPLES,
+):
+    """
+    Poll seabird and aquadopp devices in one powered line session, a failed device
+    type is returned as None without aborting the other
+    """
+    with imm_components():
+        with active_line() as serial:
+            seabird_samples = poll_recent_samples(
+                serial, seabird, seabird_ids, seabird_n
+            )
+            aquadopp_samples = poll_recent_samples(
+                serial, aquadopp, aquadopp_ids, aquadopp_n
+            )
+
+    return seabird_samples, aquadopp_samples
+
+
+@task
+def execute():
+    seabird_samples, aquadopp_samples = get_recent_samples(
+        SEABIRD_IDS, AQUADOPP_IDS, SEABIRD_RECENT_SAMPLES, AQUADOPP_RECENT_SAMPLES
+    )
+
+    if seabird_samples is not None:
+        seabird.log_samples(
+            seabird.average_samples(
+                seabird_samples, SEABIRD_IDS, SEABIRD_RECENT_SAMPLES
+            )
+        )
+    if aquadopp_samples is not None:
+        aquadopp.log_samples(aquadopp_samples)
+
+    if seabird_samples is None or aquadopp_samples is None:
+        raise Exception("Polling one or more IMM devices failed")
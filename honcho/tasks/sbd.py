@@ -1,5 +1,7 @@
+import json
 import logging
 import os
+import zlib
 from collections import namedtuple
 from contextlib import closing, contextmanager
 from datetime import datetime
@@ -7,11 +9,17 @@ from time import sleep
 
 from serial import Serial
 
-from honcho.config import (DATA_TAGS, GPIO, SBD_BAUD, SBD_PORT, SBD_QUEUE_DIR,
-                           SBD_QUEUE_FILENAME, SBD_QUEUE_MAX_TIME, SBD_SIGNAL_TRIES,
-                           SBD_SIGNAL_WAIT, SBD_STARTUP_WAIT)
-from honcho.core.gpio import powered
-from honcho.core.iridium import check_signal, send_sbd
+import honcho.core.data as data
+from honcho.config import (DATA_LOG_FILENAME, DATA_TAGS, GPIO, SBD_BAUD,
+                           SBD_BINARY_FORMAT, SBD_BINARY_TAGS, SBD_COMPRESSED_FORMAT,
+                           SBD_COMPRESSION_PACK_FACTOR, SBD_DICTIONARY_FILEPATH,
+                           SBD_DICTIONARY_SIZE, SBD_DICTIONARY_VERSION, SBD_MAX_SIZE,
+                           SBD_PORT, SBD_QUEUE_DIR, SBD_QUEUE_FILENAME,
+                           SBD_QUEUE_MAX_TIME, SBD_RECORD_SEP, SBD_SIGNAL_TRIES,
+                           SBD_SIGNAL_WAIT, SBD_STARTUP_WAIT, SEP)
+from honcho.core.gpio import powered, warm_up
+from honcho.core.iridium import check_signal, message_size, send_sbd, send_sbd_binary
+from honcho.tasks import import_task
 from honcho.tasks.common import task
 from honcho.tasks.upload import queue_filepaths
 
@@ -19,6 +27,17 @@ logger = logging.getLogger(__name__)
 
 SBDQueueCountSample = namedtuple("SBDQueueCountSample", DATA_TAGS)
 
+# Task modules holding the DATA_KEYS/CONVERSION_TO_STRING of each binary tag
+BINARY_SCHEMA_TASKS = {
+    DATA_TAGS.SBD: "seabird",
+    DATA_TAGS.AQD: "aquadopp",
+    DATA_TAGS.WXT: "weather",
+    DATA_TAGS.GGA: "gps",
+    DATA_TAGS.CRX: "crx",
+    DATA_TAGS.SOL: "solar",
+}
+DICTIONARY_TAGS = tuple(BINARY_SCHEMA_TASKS) + (DATA_TAGS.MON,)
+
 
 @contextmanager
 def sbd_components():
@@ -26,7 +45,7 @@ def sbd_components():
         logger.debug(
             "Sleeping for {0} seconds for iridium startup".format(SBD_STARTUP_WAIT)
         )
-        sleep(SBD_STARTUP_WAIT)
+        warm_up([GPIO.SER, GPIO.SBD, GPIO.IRD], SBD_STARTUP_WAIT)
         yield
 
 
@@ -48,20 +67,259 @@ def build_queue():
     return queue
 
 
-def send_queue(serial, timeout=SBD_QUEUE_MAX_TIME):
-    queue = build_queue()
-    logger.info("Sending {0} queued sbds".format(len(queue)))
+def is_packable(record):
+    return not any(el in record for el in ("\n", "\r", SBD_RECORD_SEP))
+
+
+def load_binary_schema(tag):
+    task = import_task(BINARY_SCHEMA_TASKS[tag])
+
+    return data.binary_schema(task.DATA_KEYS, task.CONVERSION_TO_STRING)
+
+
+def binary_schemas():
+    """
+    Binary layout of all SBD_BINARY_TAGS, fingerprinted so the ground decoder
+    can check it holds the matching schema
+    """
+    layout = {
+        "tags": list(DATA_TAGS),
+        "schemas": dict((tag, load_binary_schema(tag)) for tag in SBD_BINARY_TAGS),
+    }
+    serialized = json.dumps(layout, sort_keys=True, separators=(",", ":"))
+    layout["fingerprint"] = zlib.crc32(serialized) & 0xFF
+    layout["format"] = SBD_BINARY_FORMAT
+
+    return layout
+
+
+def binary_header(layout):
+    return bytes(bytearray([layout["format"], layout["fingerprint"]]))
+
+
+def is_binary(message):
+    return bytearray(message[:1]) in (
+        bytearray([SBD_BINARY_FORMAT]),
+        bytearray([SBD_COMPRESSED_FORMAT]),
+    )
+
+
+def is_compressed(message):
+    return bytearray(message[:1]) == bytearray([SBD_COMPRESSED_FORMAT])
+
+
+def encode_record(record, layout):
+    tag, serialized = record.split(SEP, 1)
+    encoded = data.encode_binary(serialized, layout["schemas"][tag])
+
+    return bytes(bytearray([layout["tags"].index(tag)])) + encoded
+
+
+def load_dictionary(version):
+    with open(SBD_DICTIONARY_FILEPATH(version), "rb") as f:
+        dictionary = f.read()
+
+    return dictionary
+
+
+def train_dictionary(version, size=SBD_DICTIONARY_SIZE, tags=DICTIONARY_TAGS):
+    """
+    Build a compression dictionary from the records in the data logs. Records
+    are sampled evenly through each log to cover the range of values seen, most
+    frequent tags last where they are cheapest to reference.
+    """
+    logged = {}
+    for tag in tags:
+        filepath = DATA_LOG_FILENAME(tag)
+        if os.path.exists(filepath):
+            with open(filepath, "r") as f:
+                logged[tag] = [tag + SEP + line.strip() for line in f if line.strip()]
+
+    tags = sorted((tag for tag in logged if logged[tag]), key=lambda t: len(logged[t]))
+    sampled = []
+    for tag in tags:
+        lines = logged[tag]
+        average_size = sum(len(line) for line in lines) / float(len(lines))
+        n = max(1, int(size / len(tags) / (average_size + len(SBD_RECORD_SEP))))
+        step = max(1, len(lines) // n)
+        sampled.extend(lines[::-1][::step][:n][::-1])
+
+    dictionary = SBD_RECORD_SEP.join(sampled)[-size:]
+    filepath = SBD_DICTIONARY_FILEPATH(version)
+    with open(filepath, "wb") as f:
+        f.write(dictionary)
+    logger.info(
+        "Trained {0} byte dictionary from {1} records: {2}".format(
+            len(dictionary), len(sampled), filepath
+        )
+    )
+
+    # Ground decoder needs the same dictionary
+    queue_filepaths([filepath], tarball=False)
+
+    return filepath
+
+
+def _primed_compressor(dictionary):
+    # zlib in python 2 has no preset dictionary, instead prime a raw deflate
+    # stream with it: blocks after the sync flush can reference the dictionary
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    prefix = compressor.compress(dictionary) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    return compressor, prefix
+
+
+def compress_message(message, dictionary, version):
+    compressor, _ = _primed_compressor(dictionary)
+    compressed = compressor.compress(message) + compressor.flush()
+
+    return bytes(bytearray([SBD_COMPRESSED_FORMAT, version])) + compressed
+
+
+def decompress_message(message, dictionary=None):
+    if dictionary is None:
+        dictionary = load_dictionary(bytearray(message[1:2])[0])
+
+    _, prefix = _primed_compressor(dictionary)
+    decompressor = zlib.decompressobj(-15)
+    decompressed = decompressor.decompress(prefix + message[2:])
+
+    return decompressed[len(dictionary) :]
+
+
+def build_messages(kind, records, filepaths, layout, dictionary, max_size):
+    if kind == "binary":
+        message = binary_header(layout) + b"".join(records)
+    else:
+        message = SBD_RECORD_SEP.join(records)
+
+    if dictionary is not None and kind is not None:
+        compressed = compress_message(message, dictionary, SBD_DICTIONARY_VERSION)
+        if len(compressed) < len(message):
+            message = compressed
+
+    # Packed beyond what compression could fit, split
+    if len(message) > max_size and len(records) > 1:
+        half = len(records) // 2
+        return build_messages(
+            kind, records[:half], filepaths[:half], layout, dictionary, max_size
+        ) + build_messages(
+            kind, records[half:], filepaths[half:], layout, dictionary, max_size
+        )
+
+    return [(message, filepaths)]
+
+
+def pack_queue(queue, max_size=SBD_MAX_SIZE):
+    """
+    First-fit packing of queued records (oldest first) into messages of at most
+    max_size bytes. Text records are joined by SBD_RECORD_SEP, records of
+    SBD_BINARY_TAGS are encoded and concatenated behind a binary header. With a
+    compression dictionary, messages are packed fuller and compressed.
+    Records that can't be packed are left in messages of their own.
+    """
+    layout = binary_schemas() if SBD_BINARY_TAGS else None
+
+    dictionary, budget = None, max_size
+    if SBD_DICTIONARY_VERSION is not None:
+        try:
+            dictionary = load_dictionary(SBD_DICTIONARY_VERSION)
+            budget = max_size * SBD_COMPRESSION_PACK_FACTOR
+        except IOError:
+            logger.error("Failed to load dictionary, sending uncompressed")
+
+    bins = []
     for filepath in queue:
-        logger.debug("Sending: {0}".format(filepath))
         with open(filepath, "r") as f:
-            message = f.read().strip()
+            record = f.read().strip()
+
+        kind, size = "text", message_size(record)
+        if not is_packable(record):
+            kind = None
+        elif layout is not None and record.split(SEP, 1)[0] in SBD_BINARY_TAGS:
+            try:
+                record = encode_record(record, layout)
+                kind, size = "binary", len(record)
+            except Exception:
+                logger.warning(
+                    "Sending as text, binary encoding failed: {0}".format(filepath)
+                )
+
+        sep_size = len(SBD_RECORD_SEP) if kind == "text" else 0
+        for el in bins:
+            if (
+                kind is not None
+                and el["kind"] == kind
+                and el["size"] + sep_size + size <= budget
+            ):
+                el["records"].append(record)
+                el["filepaths"].append(filepath)
+                el["size"] += sep_size + size
+                break
+        else:
+            if kind == "binary":
+                size += len(binary_header(layout))
+            bins.append(
+                {
+                    "kind": kind,
+                    "records": [record],
+                    "filepaths": [filepath],
+                    "size": size,
+                }
+            )
+
+    packed = []
+    for el in bins:
+        packed.extend(
+            build_messages(
+                el["kind"], el["records"], el["filepaths"], layout, dictionary, max_size
+            )
+        )
+
+    return packed
+
+
+def unpack_message(message, layout=None, dictionary=None):
+    if is_compressed(message):
+        message = decompress_message(message, dictionary)
+
+    if not is_binary(message):
+        return message.split(SBD_RECORD_SEP)
+
+    if layout is None:
+        layout = binary_schemas()
+    buf = bytearray(message)
+    if buf[1] != layout["fingerprint"]:
+        raise Exception("Binary message does not match schema fingerprint")
+
+    records, pos = [], 2
+    while pos < len(buf):
+        tag = layout["tags"][buf[pos]]
+        serialized, pos = data.decode_binary(buf, layout["schemas"][tag], pos + 1)
+        records.append(tag + SEP + serialized)
+
+    return records
+
+
+def send_queue(serial, timeout=SBD_QUEUE_MAX_TIME):
+    queue = build_queue()
+    packed = pack_queue(queue)
+    logger.info(
+        "Sending {0} queued sbds in {1} messages".format(len(queue), len(packed))
+    )
+    for message, filepaths in packed:
+        logger.debug("Sending: {0}".format(", ".join(filepaths)))
         try:
-            assert ("\n" not in message) and ("\r" not in message)
-            send_sbd(serial=serial, message=message)
+            if is_binary(message):
+                send_sbd_binary(serial=serial, message=message)
+            else:
+                assert ("\n" not in message) and ("\r" not in message)
+                send_sbd(serial=serial, message=message)
         except Exception:
-            queue_filepaths([filepath])
+            queue_filepaths(filepaths)
         finally:
-            os.remove(filepath)
+            for filepath in filepaths:
+                os.remove(filepath)
 
 
 def queue_sbd(message, tag):
@@ -74,21 +74,25 @@ def parse_samples(device_id, raw):
     return samples
 
 
-def get_recent_samples(device_ids, n=SEABIRD_RECENT_SAMPLES):
+def poll_recent_samples(serial, device_ids, n=SEABIRD_RECENT_SAMPLES):
     samples = []
+    for device_id in device_ids:
+        raw = query_samples(serial, device_id, n)
+        samples.extend(parse_samples(device_id, raw))
+
+    return samples
+
+
+def get_recent_samples(device_ids, n=SEABIRD_RECENT_SAMPLES):
     with imm_components():
         with active_line() as serial:
-            for device_id in device_ids:
-                raw = query_samples(serial, device_id, n)
-                samples.extend(parse_samples(device_id, raw))
+            samples = poll_recent_samples(serial, device_ids, n)
 
     return samples
 
 
-def get_averaged_samples(device_ids, n=SEABIRD_RECENT_SAMPLES):
-    samples = get_recent_samples(device_ids, n)
+def average_samples(samples, device_ids, n=SEABIRD_RECENT_SAMPLES):
     averaged_samples = []
-
     for device_id in device_ids:
         device_samples = [sample for sample in samples if sample.device_id == device_id]
         timestamp = average_datetimes([sample.timestamp for sample in device_samples])
@@ -106,6 +110,12 @@ def get_averaged_samples(device_ids, n=SEABIRD_RECENT_SAMPLES):
     return averaged_samples
 
 
+def get_averaged_samples(device_ids, n=SEABIRD_RECENT_SAMPLES):
+    samples = get_recent_samples(device_ids, n)
+
+    return average_samples(samples, device_ids, n)
+
+
 def start(device_ids):
     with imm_components():
         with active_line() as serial:
@@ -219,10 +229,14 @@ def print_samples(samples):
     data.print_samples(samples, CONVERSION_TO_STRING)
 
 
-@task
-def execute():
-    samples = get_averaged_samples(SEABIRD_IDS, SEABIRD_RECENT_SAMPLES)
+def log_samples(samples):
     for sample in samples:
         serialized = data.serialize(sample, CONVERSION_TO_STRING)
         data.log_serialized(serialized, DATA_TAGS.SBD)
         queue_sbd(serialized, DATA_TAGS.SBD)
+
+
+@task
+def execute():
+    samples = get_averaged_samples(SEABIRD_IDS, SEABIRD_RECENT_SAMPLES)
+    log_samples(samples)
@@ -8,9 +8,8 @@ from logging import getLogger
 
 import honcho.core.data as data
 import honcho.tasks.archive as archive
-import honcho.tasks.orders as orders
+import honcho.tasks.comms as comms
 import honcho.tasks.sbd as sbd
-import honcho.tasks.upload as upload
 from honcho.config import (ARCHIVE_DIR, DATA_DIR, DATA_TAGS, DIRECTORIES_TO_MONITOR,
                            EXECUTION_LOG_FILEPATH, MAINTENANCE_HOUR, SEP,
                            SKIP_MAINTENANCE, START_SCHEDULE_COMMAND, TIMESTAMP_FMT)
@@ -124,9 +123,7 @@ def run_maintenance():
         for schedule_process in schedule_processes:
             os.kill(int(schedule_process.pid), signal.SIGKILL)
 
-    orders.execute()
-    sbd.execute()
-    upload.execute()
+    comms.execute()
     archive.execute()
 
 
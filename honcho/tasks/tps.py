@@ -9,7 +9,7 @@ from serial import Serial
 from honcho.config import (DATA_DIR, DATA_TAGS, GPIO, GPS_BAUD, GPS_PORT,
                            GPS_STARTUP_WAIT, MEASUREMENTS, SECONDS_PER_MEASUREMENT,
                            TIMESTAMP_FILENAME_FMT)
-from honcho.core.gpio import powered
+from honcho.core.gpio import powered, warm_up
 from honcho.tasks.archive import archive_filepaths
 from honcho.tasks.common import task
 from honcho.tasks.upload import queue_filepaths
@@ -60,7 +60,7 @@ def get_tps():
     filename = datetime.now().strftime(TIMESTAMP_FILENAME_FMT) + ".tps"
     output_filepath = os.path.join(DATA_DIR(DATA_TAGS.TPS), filename)
     with powered([GPIO.SER, GPIO.GPS]):
-        sleep(GPS_STARTUP_WAIT)
+        warm_up([GPIO.SER, GPIO.GPS], GPS_STARTUP_WAIT)
         with closing(Serial(GPS_PORT, GPS_BAUD, timeout=60)) as serial:
             query_tps(serial, output_filepath)
 
@@ -1,78 +1,547 @@
+import json
 import os
+import re
 import shutil
-from datetime import datetime
+from datetime import datetime, timedelta
+from ftplib import error_perm, error_reply
 from logging import getLogger
+from math import exp
 
-from honcho.config import UPLOAD_CLEANUP, UPLOAD_QUEUE_DIR
-from honcho.core.data import chunk_file, compute_checksum, make_chunk_joiner
+from honcho.config import (DATA_LOG_FILENAME, DATA_TAGS, FTP_CHUNK_OVERHEAD,
+                           FTP_CHUNK_SIZE, FTP_CHUNK_SIZES, FTP_LINK_HISTORY,
+                           FTP_LINK_STATS_FILEPATH, TIMESTAMP_FILENAME_FMT,
+                           TIMESTAMP_FMT, UPLOAD_AGEING_HOURS, UPLOAD_APPEND_LOG_TAGS,
+                           UPLOAD_CLEANUP, UPLOAD_DEFAULT_PRIORITY,
+                           UPLOAD_LOG_OFFSETS_FILEPATH, UPLOAD_MANIFEST_FILEPATH,
+                           UPLOAD_MANIFEST_SIZE, UPLOAD_PRIORITIES,
+                           UPLOAD_PROGRESS_FILEPATH, UPLOAD_QUEUE_DIR,
+                           UPLOAD_SESSION_BYTES, UPLOAD_SESSION_SECONDS)
+from honcho.core.data import (PARTIAL_CHUNK_PATTERN, chunk_tarball, compute_checksum,
+                              make_chunk_joiner)
 from honcho.core.ftp import ftp_session
-from honcho.tasks.archive import archive_filepaths
+from honcho.tasks.archive import archive_filename, archive_filepaths, get_codec
 from honcho.tasks.common import task
-from honcho.util import clear_directory, file_size
+from honcho.util import clear_directory, file_size, total_seconds
 
 logger = getLogger(__name__)
 
+TAG_PATTERN = r"(^|_)(?P<tag>{0})(\.|_|$)".format("|".join(DATA_TAGS))
+# Log filename, generation, start and end offsets
+SEGMENT_HEADER = "#SEGMENT {0} {1} {2} {3}\n"
+
+
+def source_key(filepath):
+    """
+    Name, size and modification time of a file to be queued, keying the
+    dedupe without reading the file
+    """
+    stat = os.stat(filepath)
+
+    return "{0}:{1}:{2!r}".format(
+        os.path.basename(filepath), stat.st_size, stat.st_mtime
+    )
+
+
+def select_new(filepaths, manifest):
+    """
+    Filepaths (and their source keys) not already uploaded or queued
+    """
+    for filename in list(manifest["checksums"]):
+        if not os.path.exists(os.path.join(UPLOAD_QUEUE_DIR, filename)):
+            del manifest["checksums"][filename]
+    held = set(manifest["uploaded"])
+    for filename, keys in list(manifest["queued"].items()):
+        if os.path.exists(os.path.join(UPLOAD_QUEUE_DIR, filename)):
+            held.update(keys)
+        else:
+            del manifest["queued"][filename]
+
+    new_filepaths, keys = [], []
+    for filepath in filepaths:
+        key = source_key(filepath)
+        if key in held:
+            logger.debug("Already uploaded or queued, skipping: {0}".format(filepath))
+        else:
+            held.add(key)
+            new_filepaths.append(filepath)
+            keys.append(key)
+
+    return new_filepaths, keys
+
+
+def queued_filename(filepath, prefix=None, postfix=None):
+    """
+    Name of a file queued as is, with the prefix and postfix (the data tag its
+    upload priority comes from) added if not already in it
+    """
+    root, ext = os.path.splitext(os.path.basename(filepath))
+    if prefix is not None and not root.startswith(prefix + "_"):
+        root = prefix + "_" + root
+    if postfix is not None and get_tag(root) != postfix:
+        root += "_" + postfix
+
+    return root + ext
+
 
 def queue_filepaths(filepaths, prefix=None, postfix=None, tarball=True):
+    manifest = load_manifest()
+    filepaths, keys = select_new(filepaths, manifest)
+    if not filepaths:
+        return []
+
     queued_filepaths = []
     if tarball:
-        queued_filepaths.append(
-            archive_filepaths(
-                filepaths, prefix, postfix, output_directory=UPLOAD_QUEUE_DIR
-            )
+        queued_filepath = archive_filepaths(
+            filepaths, prefix, postfix, output_directory=UPLOAD_QUEUE_DIR
         )
+        queued_filepaths.append(queued_filepath)
+        manifest["queued"][os.path.basename(queued_filepath)] = keys
     else:
-        for filepath in filepaths:
-            queued_filepath = os.path.join(UPLOAD_QUEUE_DIR, os.path.basename(filepath))
+        for filepath, key in zip(filepaths, keys):
+            queued_filepath = os.path.join(
+                UPLOAD_QUEUE_DIR, queued_filename(filepath, prefix, postfix)
+            )
             shutil.copy(filepath, queued_filepath)
             queued_filepaths.append(queued_filepath)
+            manifest["queued"][os.path.basename(queued_filepath)] = [key]
+    # Checksummed once here instead of every upload session
+    for queued_filepath in queued_filepaths:
+        manifest["checksums"][os.path.basename(queued_filepath)] = compute_checksum(
+            queued_filepath
+        )
+    save_manifest(manifest)
 
     return queued_filepaths
 
 
+def queue_log_tail(log_filepath):
+    """
+    Queue what was appended to log_filepath since it was last queued, as a
+    segment starting with a SEGMENT_HEADER line (joined on the ground by
+    utils/iridium/join_segments.py). A new or truncated log starts a new
+    generation from offset 0.
+    """
+    if not os.path.exists(log_filepath):
+        return None
+
+    offsets = _load_json(UPLOAD_LOG_OFFSETS_FILEPATH, {})
+    stat = os.stat(log_filepath)
+    shipped = offsets.get(log_filepath)
+    if (
+        shipped is None
+        or shipped["inode"] != stat.st_ino
+        or shipped["offset"] > stat.st_size
+    ):
+        shipped = {
+            "inode": stat.st_ino,
+            "generation": datetime.now().strftime(TIMESTAMP_FILENAME_FMT),
+            "offset": 0,
+        }
+    start = shipped["offset"]
+    if stat.st_size == start:
+        logger.debug("Nothing appended to {0}".format(log_filepath))
+        return None
+
+    filename = os.path.basename(log_filepath)
+    segment_filepath = os.path.join(
+        UPLOAD_QUEUE_DIR,
+        "{0}.{1}.{2:010d}.seg".format(filename, shipped["generation"], start),
+    )
+    with open(log_filepath, "rb") as fi:
+        fi.seek(start)
+        tail = fi.read(stat.st_size - start)
+    with open(segment_filepath, "wb") as fo:
+        header = SEGMENT_HEADER.format(
+            filename, shipped["generation"], start, start + len(tail)
+        )
+        fo.write(header.encode("ascii"))
+        fo.write(tail)
+
+    shipped["offset"] = start + len(tail)
+    offsets[log_filepath] = shipped
+    _save_json(UPLOAD_LOG_OFFSETS_FILEPATH, offsets)
+
+    return segment_filepath
+
+
+def queue_log_tails():
+    return [
+        segment_filepath
+        for segment_filepath in (
+            queue_log_tail(DATA_LOG_FILENAME(tag)) for tag in UPLOAD_APPEND_LOG_TAGS
+        )
+        if segment_filepath is not None
+    ]
+
+
 def queue_filepaths_chunked(filepaths, prefix=None, postfix=None):
-    tarball_filepath = archive_filepaths(
-        filepaths, prefix, postfix, output_directory=UPLOAD_QUEUE_DIR
+    manifest = load_manifest()
+    filepaths, keys = select_new(filepaths, manifest)
+    if not filepaths:
+        return []
+
+    tarball_filepath = os.path.join(UPLOAD_QUEUE_DIR, archive_filename(prefix, postfix))
+    chunk_size = select_chunk_size(load_link_stats())
+    logger.debug("Chunking {0} at {1} bytes".format(tarball_filepath, chunk_size))
+    compression, _ = get_codec(postfix)
+    chunk_filepaths, parity_filepaths, checksum, checksums = chunk_tarball(
+        filepaths, tarball_filepath, chunk_size=chunk_size, compression=compression
+    )
+    joiner_filepath = make_chunk_joiner(
+        chunk_filepaths, checksum, parity_filepaths, chunk_size=chunk_size
+    )
+    checksums[joiner_filepath] = compute_checksum(joiner_filepath)
+    for filepath, file_checksum in checksums.items():
+        manifest["checksums"][os.path.basename(filepath)] = file_checksum
+    # Counted as uploaded with the joiner
+    manifest["queued"][os.path.basename(joiner_filepath)] = keys
+    save_manifest(manifest)
+
+    return chunk_filepaths + parity_filepaths + [joiner_filepath]
+
+
+def _load_json(filepath, default):
+    if not os.path.exists(filepath):
+        return default
+    with open(filepath, "r") as f:
+        return json.load(f)
+
+
+def _save_json(filepath, data):
+    tmp_filepath = filepath + ".tmp"
+    with open(tmp_filepath, "w") as f:
+        json.dump(data, f)
+    os.rename(tmp_filepath, filepath)
+
+
+def load_progress():
+    return _load_json(UPLOAD_PROGRESS_FILEPATH, {})
+
+
+def save_progress(progress):
+    _save_json(UPLOAD_PROGRESS_FILEPATH, progress)
+
+
+def load_manifest():
+    """
+    Checksums and source keys of content uploaded (with when), source keys of the
+    content in each queued file and checksums of the queued files
+    """
+    manifest = _load_json(UPLOAD_MANIFEST_FILEPATH, {"uploaded": {}, "queued": {}})
+    manifest.setdefault("checksums", {})
+
+    return manifest
+
+
+def save_manifest(manifest):
+    # Forget the oldest uploads past UPLOAD_MANIFEST_SIZE
+    uploaded = manifest["uploaded"]
+    n_expired = len(uploaded) - UPLOAD_MANIFEST_SIZE
+    if n_expired > 0:
+        for checksum in sorted(uploaded, key=uploaded.get)[:n_expired]:
+            del uploaded[checksum]
+    _save_json(UPLOAD_MANIFEST_FILEPATH, manifest)
+
+
+def get_checksum(filepath, manifest):
+    """
+    Checksum of a queued file, as recorded when it was queued if it was
+    """
+    checksum = manifest["checksums"].get(os.path.basename(filepath))
+    if checksum is None:
+        checksum = compute_checksum(filepath)
+
+    return checksum
+
+
+def set_uploaded(filepath):
+    manifest = load_manifest()
+    filename = os.path.basename(filepath)
+    checksum = get_checksum(filepath, manifest)
+    manifest["checksums"].pop(filename, None)
+    timestamp = datetime.now().strftime(TIMESTAMP_FMT)
+    for uploaded in [checksum] + manifest["queued"].pop(filename, []):
+        manifest["uploaded"][uploaded] = timestamp
+    save_manifest(manifest)
+
+
+def load_link_stats():
+    return _load_json(FTP_LINK_STATS_FILEPATH, [])
+
+
+def record_transfer(n_bytes, seconds, failed):
+    """
+    Add a transfer to the link stats, keeping the last FTP_LINK_HISTORY
+    """
+    link_stats = load_link_stats()
+    link_stats.append({"bytes": n_bytes, "seconds": seconds, "failed": failed})
+    _save_json(FTP_LINK_STATS_FILEPATH, link_stats[-FTP_LINK_HISTORY:])
+
+
+def link_throughput(link_stats):
+    """
+    Observed bytes per second over the link stats, None without any
+    """
+    n_bytes = sum(transfer["bytes"] for transfer in link_stats)
+    seconds = sum(transfer["seconds"] for transfer in link_stats)
+    if not n_bytes or not seconds:
+        return None
+
+    return n_bytes / float(seconds)
+
+
+def transfer_seconds(n_bytes, throughput):
+    """
+    Estimated seconds to send n_bytes at throughput, 0 if it is unknown
+    """
+    if throughput is None:
+        return 0
+
+    return FTP_CHUNK_OVERHEAD + n_bytes / throughput
+
+
+def select_chunk_size(link_stats):
+    """
+    Chunk size from FTP_CHUNK_SIZES with the most expected goodput, assuming
+    drops arrive at the observed rate per byte and a dropped chunk is wasted
+    """
+    throughput = link_throughput(link_stats)
+    if throughput is None:
+        return FTP_CHUNK_SIZE
+
+    n_bytes = sum(transfer["bytes"] for transfer in link_stats)
+    drops_per_byte = sum(transfer["failed"] for transfer in link_stats) / float(n_bytes)
+
+    def goodput(chunk_size):
+        success = exp(-drops_per_byte * chunk_size)
+        return success * chunk_size / (FTP_CHUNK_OVERHEAD + chunk_size / throughput)
+
+    return max(FTP_CHUNK_SIZES, key=goodput)
+
+
+def set_progress(filename, size=None):
+    """
+    Record filename of size bytes as partially uploaded, or with no size as done
+    """
+    progress = load_progress()
+    if size is None:
+        progress.pop(filename, None)
+    else:
+        progress[filename] = {
+            "size": size,
+            "started": datetime.now().strftime(TIMESTAMP_FMT),
+        }
+    save_progress(progress)
+
+
+def get_resume_offset(session, filename, size):
+    """
+    Bytes of filename already on the server from an interrupted upload, 0 if
+    it was not started or the server does not support SIZE
+    """
+    progress = load_progress().get(filename)
+    if progress is None or progress["size"] != size:
+        return 0
+
+    try:
+        # Servers such as ProFTPD refuse SIZE in ASCII mode
+        session.voidcmd("TYPE I")
+        remote_size = session.size(filename)
+    except (error_perm, error_reply):
+        logger.debug("Remote size of {0} unavailable".format(filename))
+        return 0
+    if remote_size is None or remote_size > size:
+        return 0
+
+    return remote_size
+
+
+class UploadBudgetExceeded(Exception):
+    pass
+
+
+class UploadBudget(object):
+    """
+    Bytes and seconds an upload session may use, checked between files so a
+    transfer is never cut short with its reply unread on the session
+    """
+
+    def __init__(self, max_bytes=UPLOAD_SESSION_BYTES, seconds=UPLOAD_SESSION_SECONDS):
+        self.remaining_bytes = max_bytes
+        self.deadline = datetime.now() + timedelta(seconds=seconds)
+
+    def spend(self, n_bytes):
+        self.remaining_bytes -= n_bytes
+
+    def check(self):
+        if self.remaining_bytes <= 0 or datetime.now() > self.deadline:
+            raise UploadBudgetExceeded()
+
+    def fits(self, n_bytes, seconds=0):
+        """
+        Whether a transfer of n_bytes, taking an estimated seconds, fits what is left
+        """
+        return (
+            n_bytes <= self.remaining_bytes
+            and datetime.now() + timedelta(seconds=seconds) <= self.deadline
+        )
+
+
+def get_tag(filename):
+    match = re.search(TAG_PATTERN, filename)
+    if match:
+        return match.group("tag")
+
+
+def get_priority(filepath, now):
+    """
+    Upload priority class of the file's data tag, lowest first, less its age
+    in UPLOAD_AGEING_HOURS
+    """
+    priority = UPLOAD_PRIORITIES.get(
+        get_tag(os.path.basename(filepath)), UPLOAD_DEFAULT_PRIORITY
     )
-    checksum = compute_checksum(tarball_filepath)
-    chunk_filepaths = chunk_file(tarball_filepath, UPLOAD_QUEUE_DIR)
-    joiner_filepath = make_chunk_joiner(chunk_filepaths, checksum)
+    age = now - datetime.fromtimestamp(os.path.getmtime(filepath))
 
-    os.remove(tarball_filepath)
+    return priority - total_seconds(age) / (3600.0 * UPLOAD_AGEING_HOURS)
 
-    return chunk_filepaths + [joiner_filepath]
+
+def get_queue():
+    """
+    Queued filepaths in upload order, by priority and then smallest first. Chunks
+    still being written (or left partial by a crash) are not queued yet
+    """
+    now = datetime.now()
+    filepaths = [
+        os.path.join(UPLOAD_QUEUE_DIR, filename)
+        for filename in os.listdir(UPLOAD_QUEUE_DIR)
+        if not re.search(PARTIAL_CHUNK_PATTERN, filename)
+    ]
+
+    return sorted(
+        filepaths,
+        key=lambda filepath: (get_priority(filepath, now), os.path.getsize(filepath)),
+    )
 
 
-def upload(filepath, session):
+def store(session, filename, fi, offset, budget=None):
+    fi.seek(offset)
+    sent = [0]
+
+    def count(block):
+        sent[0] += len(block)
+        if budget is not None:
+            budget.spend(len(block))
+
+    start = datetime.now()
+    try:
+        session.storbinary(
+            "STOR {0}".format(filename),
+            fi,
+            callback=count,
+            rest=offset if offset else None,
+        )
+    except (error_perm, error_reply):
+        # Refused, not a link failure
+        if sent[0]:
+            record_transfer(sent[0], total_seconds(datetime.now() - start), False)
+        raise
+    except Exception:
+        record_transfer(sent[0], total_seconds(datetime.now() - start), True)
+        raise
+    record_transfer(sent[0], total_seconds(datetime.now() - start), False)
+
+
+def upload(filepath, session, budget=None):
     filename = os.path.basename(filepath)
+    size = os.path.getsize(filepath)
+    offset = get_resume_offset(session, filename, size)
+    set_progress(filename, size)
     with open(filepath, "rb") as fi:
         logger.debug("Uploading {0} bytes: {1}".format(file_size(filepath), filepath))
         start = datetime.now()
-        session.storbinary("STOR {0}".format(filename), fi)
+        if offset == size:
+            logger.debug("Already uploaded: {0}".format(filepath))
+        elif offset:
+            logger.debug("Resuming upload at {0} bytes".format(offset))
+            try:
+                store(session, filename, fi, offset, budget)
+            except (error_perm, error_reply):
+                logger.debug("Resume not supported, restarting upload")
+                store(session, filename, fi, 0, budget)
+        else:
+            store(session, filename, fi, 0, budget)
         logger.debug("Upload successful: {0}".format(datetime.now() - start))
+    set_progress(filename)
 
 
 def print_queue():
-    for filename in os.listdir(UPLOAD_QUEUE_DIR):
-        filepath = os.path.join(UPLOAD_QUEUE_DIR, filename)
-        print("\t".join([file_size(filepath), filepath]))
+    progress = load_progress()
+    for filepath in get_queue():
+        filename = os.path.basename(filepath)
+        fields = [file_size(filepath), filepath]
+        if filename in progress:
+            fields.append("started {0}".format(progress[filename]["started"]))
+        print("\t".join(fields))
 
 
 def clear_queue():
     clear_directory(UPLOAD_QUEUE_DIR)
+    save_progress({})
+    manifest = load_manifest()
+    manifest["queued"] = {}
+    manifest["checksums"] = {}
+    save_manifest(manifest)
+
+
+def drop_uploaded(filepaths):
+    """
+    Queued files with content not already uploaded, the others are removed
+    """
+    manifest = load_manifest()
+    remaining = []
+    for filepath in filepaths:
+        if get_checksum(filepath, manifest) in manifest["uploaded"]:
+            logger.debug("Already uploaded, skipping: {0}".format(filepath))
+            if UPLOAD_CLEANUP:
+                os.remove(filepath)
+        else:
+            remaining.append(filepath)
+
+    return remaining
 
 
 @task
 def execute():
-    filenames = os.listdir(UPLOAD_QUEUE_DIR)
-    if not filenames:
+    filepaths = drop_uploaded(get_queue())
+    if not filepaths:
         logger.debug("No files queued for upload")
         return
     with ftp_session() as session:
-        logger.debug("Queued files for upload: {0}".format(len(filenames)))
-        for filename in filenames:
-            filepath = os.path.join(UPLOAD_QUEUE_DIR, filename)
-            upload(filepath, session=session)
+        logger.debug("Queued files for upload: {0}".format(len(filepaths)))
+        budget = UploadBudget()
+        throughput = link_throughput(load_link_stats())
+        deferred = 0
+        for i, filepath in enumerate(filepaths):
+            try:
+                budget.check()
+            except UploadBudgetExceeded:
+                logger.info(
+                    "Upload budget spent, {0} files left queued".format(
+                        len(filepaths) - i + deferred
+                    )
+                )
+                break
+
+            # Files the rest of the budget can't take wait for the next session
+            size = os.path.getsize(filepath)
+            if not budget.fits(size, transfer_seconds(size, throughput)):
+                logger.info("Deferred, does not fit the budget: {0}".format(filepath))
+                deferred += 1
+                continue
+
+            upload(filepath, session=session, budget=budget)
+            set_uploaded(filepath)
 
             if UPLOAD_CLEANUP:
                 os.remove(filepath)
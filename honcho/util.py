@@ -7,10 +7,10 @@ from contextlib import closing
 from datetime import datetime
 from logging import getLogger
 from netrc import netrc
-from time import mktime, sleep, time
+from time import mktime, time
 
 from honcho.config import (ARCHIVE_DIR, DATA_DIR, DATA_TAGS, LOG_DIR, NETRC_FILEPATH,
-                           SBD_QUEUE_DIR, UPLOAD_QUEUE_DIR)
+                           SBD_DICTIONARY_DIR, SBD_QUEUE_DIR, UPLOAD_QUEUE_DIR)
 
 logger = getLogger(__name__)
 
@@ -24,7 +24,7 @@ def ensure_dirs(directories):
 def ensure_all_dirs():
     ensure_dirs(
         [DATA_DIR(tag) for tag in DATA_TAGS]
-        + [SBD_QUEUE_DIR, LOG_DIR, UPLOAD_QUEUE_DIR, ARCHIVE_DIR]
+        + [SBD_QUEUE_DIR, SBD_DICTIONARY_DIR, LOG_DIR, UPLOAD_QUEUE_DIR, ARCHIVE_DIR]
     )
 
 
@@ -34,28 +34,47 @@ def serial_request(serial, command, expected_regex=".+", timeout=10, poll=1):
 
     logger.debug("Sending command to {0}: {1}".format(serial.port, command.strip()))
     serial.flushInput()
-    sleep(1)
     serial.write(command)
-    sleep(1)
-    start_time = time()
+
+    return serial_response(serial, expected_regex, timeout, poll)
+
+
+def serial_response(serial, expected_regex=".+", timeout=10, poll=1):
+    """
+    Collect serial data until expected_regex matches, raising if nothing new arrives
+    for timeout seconds. Reads block for at most poll seconds and return as soon as
+    data arrives. The port's own timeout is restored on return.
+    """
+    pattern = re.compile(expected_regex, flags=re.DOTALL)
+    port_timeout = serial.timeout
+    deadline = time() + timeout
     response = ""
-    response_length = len(response)
-    while time() - start_time < timeout:
-        response += serial.read(serial.inWaiting())
-        if re.search(expected_regex, response, flags=re.DOTALL):
-            break
-
-        new_response_length = len(response)
-        if new_response_length > response_length:
-            start_time = time()
-            response_length = new_response_length
-
-        sleep(poll)
-    else:
-        logger.debug(
-            "Response collected from serial at timeout: {0}".format(response.strip())
-        )
-        raise Exception("Timed out waiting for expected serial response")
+    try:
+        while True:
+            remaining = deadline - time()
+            if remaining <= 0:
+                logger.debug(
+                    "Response collected from serial at timeout: {0}".format(
+                        response.strip()
+                    )
+                )
+                raise Exception("Timed out waiting for expected serial response")
+
+            read_timeout = min(poll, remaining)
+            if serial.timeout != read_timeout:
+                serial.timeout = read_timeout
+            received = serial.read(max(1, serial.inWaiting()))
+            if not received:
+                continue
+
+            response += received
+            # Matches may start anywhere in the response and finish in the new data
+            if pattern.search(response):
+                break
+
+            deadline = time() + timeout
+    finally:
+        serial.timeout = port_timeout
 
     logger.debug("Response collected from serial: {0}".format(response))
 
@@ -170,8 +189,12 @@ def file_size(file_path):
         return convert_bytes(file_info.st_size)
 
 
-def make_tarfile(output_filename, filepaths):
-    with closing(tarfile.open(output_filename, "w:gz")) as tar:
+def make_tarfile(output_filename, filepaths, compression="gz", compresslevel=9):
+    """
+    Compression is a tarfile compression ("gz", "bz2"), "" only stores
+    """
+    kwargs = {"compresslevel": compresslevel} if compression else {}
+    with closing(tarfile.open(output_filename, "w:" + compression, **kwargs)) as tar:
         for filepath in filepaths:
             tar.add(filepath, arcname=os.path.basename(filepath))
 
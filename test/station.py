@@ -0,0 +1,777 @@
+"""
+Simulated AMIGOS station for running tasks end to end without hardware
+
+Serial devices (iridium, IMM with seabird/aquadopp, vaisala WXT and javad GPS) are
+emulated on ptys, the sysfs devices live in a temporary directory tree (with the
+index/data register pairs emulated) and FTP is served from a local directory. Station
+paths, ports and device ids in honcho are pointed at the simulation while it is open.
+
+Benchmark a cycle of the current schedule (or given tasks) with:
+
+    $ python test/station.py [--fast] [task ...]
+"""
+import argparse
+import inspect
+import json
+import logging
+import os
+import pty
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time as _time
+from datetime import datetime, timedelta
+from io import BytesIO
+from struct import unpack
+
+import honcho.config as config
+from honcho.config import GPIO, GPIO_CONFIG
+
+SIMULATED_TASKS = (
+    "aquadopp",
+    "archive",
+    "comms",
+    "gps",
+    "imm",
+    "orders",
+    "sbd",
+    "seabird",
+    "solar",
+    "upload",
+    "weather",
+)
+FAST_SLEEP = 0.01
+# Shorter sleeps are waited for even when fast, they often pace wall clock dependent
+# loops (e.g. unique timestamped filenames)
+FAST_SLEEP_LIMIT = 1
+STATION_ROOT = "/media/mmcblk0p1"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_builtin_open = open
+
+
+class SerialDevice(object):
+    """
+    Device answering line commands on the master side of a pty
+    """
+
+    name = None
+    components = ()
+
+    def __init__(self, station):
+        self.station = station
+        self.sent = 0
+        self.received = 0
+        self.raw_length = 0
+        self._buffer = b""
+        self.master, self.slave = pty.openpty()
+        self.port = os.ttyname(self.slave)
+
+        self._thread = threading.Thread(target=self._listen)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                return
+            if not data:
+                return
+
+            self.sent += len(data)
+            if not self.station.is_powered(self.components):
+                continue
+            self._buffer += data
+            self._process()
+
+    def _process(self):
+        while True:
+            if self.raw_length:
+                if len(self._buffer) < self.raw_length:
+                    return
+                data = self._buffer[: self.raw_length]
+                self._buffer = self._buffer[self.raw_length :]
+                self.raw_length = 0
+                self.handle_raw(data)
+            else:
+                line, sep, rest = self._buffer.partition(b"\r\n")
+                if not sep:
+                    return
+                self._buffer = rest
+                if line:
+                    self.handle(line)
+
+    def handle(self, line):
+        """
+        Answer a command line, by default not at all
+        """
+
+    def handle_raw(self, data):
+        """
+        Answer raw_length bytes of data, by default not at all
+        """
+
+    def write(self, data):
+        self.received += len(data)
+        os.write(self.master, data)
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class IridiumDevice(SerialDevice):
+    name = "iridium"
+    components = (GPIO.SER, GPIO.SBD, GPIO.IRD)
+
+    def __init__(self, station, signal=5):
+        super(IridiumDevice, self).__init__(station)
+        self.signal = signal
+        self.messages = []
+        self._mo_buffer = None
+        self._text = False
+
+    def handle(self, line):
+        if self._text:
+            self._text = False
+            self._mo_buffer = line
+            self.write(b"0\r\n\r\nOK\r\n")
+        elif line == b"AT":
+            self.write(b"OK\r\n")
+        elif line == b"AT+CSQ":
+            self.write(b"+CSQ:{0}\r\n".format(self.signal))
+        elif line == b"AT+SBDD0":
+            self._mo_buffer = None
+            self.write(b"0\r\n\r\nOK\r\n")
+        elif line == b"AT+SBDWT":
+            self._text = True
+            self.write(b"READY\r\n")
+        elif line.startswith(b"AT+SBDWB="):
+            self.raw_length = int(line.split(b"=")[1]) + 2
+            self.write(b"READY\r\n")
+        elif line == b"AT+SBDIX":
+            if self._mo_buffer is not None:
+                self.messages.append(self._mo_buffer)
+            self.write(b"+SBDIX: 0, {0}, 0, 0, 0, 0\r\n".format(len(self.messages)))
+        else:
+            self.write(b"ERROR\r\n")
+
+    def handle_raw(self, data):
+        message, checksum = data[:-2], unpack(">H", data[-2:])[0]
+        if checksum == sum(bytearray(message)) & 0xFFFF:
+            self._mo_buffer = message
+            self.write(b"0\r\n\r\nOK\r\n")
+        else:
+            self.write(b"2\r\n\r\nOK\r\n")
+
+
+class IMMDevice(SerialDevice):
+    name = "imm"
+    components = (GPIO.SER, GPIO.IMM)
+
+    def __init__(self, station, seabird_ids, aquadopp_ids):
+        super(IMMDevice, self).__init__(station)
+        self.seabird_ids = seabird_ids
+        self.aquadopp_ids = aquadopp_ids
+
+    def handle(self, line):
+        if line in (b"PwrOn", b"PwrOff", b"ForceCaptureLine", b"ReleaseLine"):
+            self.write(b"<Executed/>\r\n")
+        elif line == b"SendWakeUpTone":
+            self.write(b"<Executing/>\r\n<Executed/>\r\n")
+        elif line.startswith(b"#") and line[1:3] in self.seabird_ids:
+            self.handle_seabird(line[3:])
+        elif line.startswith(b"!") and line[1:3] in self.aquadopp_ids:
+            self.handle_aquadopp(line[3:])
+        elif line[:1] not in (b"#", b"!"):
+            self.write(b"ERROR\r\n")
+
+    def handle_seabird(self, command):
+        if command.startswith(b"DN"):
+            now = datetime.now()
+            rows = [
+                b"3.00008,   1.0374,  713.998,  34.6688, "
+                + now.strftime("%H:%M:%S, %d-%m-%Y")
+                + b", 3261\r\n"
+            ] * int(command[2:])
+            self.write(
+                b"<RemoteReply>start sample number = 7770\r\n"
+                b"start time = 09 Oct 2019 14:50:01\r\n"
+                b"\r\n" + b"".join(rows) + b"<Executed/>\r\n"
+                b"</RemoteReply>\r\n"
+                b"<Executed/>\r\n"
+            )
+        else:
+            self.write(b"<RemoteReply><Executed/>\r\n</RemoteReply>\r\n<Executed/>\r\n")
+
+    def handle_aquadopp(self, command):
+        if command == b"SampleGetLast":
+            self.write(
+                b"<RemoteReply><Executing/>\r\n"
+                b"<SampleData ID='0x00000774' Len='111' CRC='0xCDB08DA1'>"
+                + datetime.now().strftime("%m %d %Y %H")
+                + b" 0 0 0 48 -0.043 0.059 -0.105 159 135 155 13.1 "
+                b"1519.8 39.8 -11.6 0.5 0.000 19.43 0 0 0.073 323.9\r\n"
+                b"</SampleData>\r\n"
+                b"<Executed/></RemoteReply>\r\n"
+                b"<Executed/>\r\n"
+            )
+        else:
+            self.write(b"<RemoteReply><Executed/></RemoteReply>\r\n<Executed/>\r\n")
+
+
+class WXTDevice(SerialDevice):
+    name = "wxt"
+    components = (GPIO.WXT,)
+    LINE = (
+        b"0R0,Dm=123D,Sm=1.2M,Ta=-12.3C,Ua=80.1P,Pa=980.1H,Rc=0.00M,Rd=0s,Ri=0.0M,"
+        b"Hc=0.0M,Hd=0s,Hi=0.0M,Rp=0.0M,Hp=0.0M,Th=-11.0C,Vh=12.0N,Vs=12.1V\r\n"
+    )
+
+    def __init__(self, station, interval):
+        super(WXTDevice, self).__init__(station)
+        self.interval = interval
+        self._emitter = threading.Thread(target=self._emit)
+        self._emitter.daemon = True
+        self._emitter.start()
+
+    def _emit(self):
+        while self.station.is_open:
+            if not self.station.is_powered(self.components):
+                _time.sleep(FAST_SLEEP)
+                continue
+            self.station.sleep(self.interval, limit=0)
+            try:
+                self.write(self.LINE)
+            except OSError:
+                return
+
+    def handle(self, line):
+        pass
+
+
+class GPSDevice(SerialDevice):
+    name = "gps"
+    components = (GPIO.SER, GPIO.GPS)
+
+    def handle(self, line):
+        now = datetime.utcnow()
+        if line == b"print,/par/time/utc/date":
+            self.write(b"RE00C " + now.strftime("%Y-%m-%d") + b"\r\n")
+        elif line == b"print,/par/time/utc/clock":
+            self.write(b"RE00F " + now.strftime("%H:%M:%S.00") + b"\r\n")
+        elif line == b"out,,nmea/GGA":
+            self.write(
+                b"$GPGGA,"
+                + now.strftime("%H%M%S.00")
+                + b",7012.345678,S,06512.345678,W,1,12,0.9,35.123,M,-10.123,M,,*47\r\n"
+            )
+        else:
+            self.write(b"ER\r\n")
+
+
+class RegisterFile(BytesIO):
+    def __init__(self, on_write=None, value=b""):
+        BytesIO.__init__(self, value)
+        self.on_write = on_write
+
+    def __exit__(self, *args):
+        if self.on_write is not None:
+            self.on_write(int(self.getvalue(), 16))
+
+
+class IndexedRegisters(object):
+    """
+    Register bank selected through an index device and accessed through a data device
+    """
+
+    def __init__(self, index_path, data_path, values, on_change=None):
+        self.index_path = index_path
+        self.data_path = data_path
+        self.values = values
+        self.on_change = on_change
+        self.index = 0
+
+    def _select(self, index):
+        self.index = index
+
+    def _set(self, value):
+        old_value = self.values.get(self.index, 0)
+        self.values[self.index] = value
+        if self.on_change is not None:
+            self.on_change(self.index, old_value, value)
+
+    def open(self, filepath, mode="r"):
+        if filepath == self.index_path:
+            return RegisterFile(on_write=self._select)
+        elif "w" in mode:
+            return RegisterFile(on_write=self._set)
+        else:
+            return RegisterFile(value=hex(self.values.get(self.index, 0)))
+
+
+class FTPStandIn(object):
+    """
+    Local directory standing in for the FTP server
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.sent = 0
+        self.received = 0
+        self.sessions = 0
+        self.down = False
+        os.makedirs(os.path.join(root, config.FTP_ORDERS_DIR.lstrip("/")))
+
+    def __call__(self, host, timeout=None):
+        if self.down:
+            raise socket.error("Connection refused")
+        self.sessions += 1
+        return FTPSession(self)
+
+
+class FTPSession(object):
+    def __init__(self, server):
+        self.server = server
+        self.directory = server.root
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def login(self, user, passwd):
+        pass
+
+    def cwd(self, directory):
+        self.directory = os.path.join(self.server.root, directory.lstrip("/"))
+
+    def pwd(self):
+        return "/" + os.path.relpath(self.directory, self.server.root).lstrip(".")
+
+    def nlst(self):
+        return os.listdir(self.directory)
+
+    def voidcmd(self, cmd):
+        pass
+
+    def size(self, filename):
+        return os.path.getsize(self._path(filename))
+
+    def storbinary(self, cmd, fp, blocksize=8192, callback=None, rest=None):
+        filename = cmd.split(" ", 1)[1]
+        with _builtin_open(self._path(filename), "r+b" if rest else "wb") as fo:
+            if rest:
+                fo.seek(rest)
+            while True:
+                block = fp.read(blocksize)
+                if not block:
+                    break
+                fo.write(block)
+                self.server.sent += len(block)
+                if callback is not None:
+                    callback(block)
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        filename = cmd.split(" ", 1)[1]
+        with _builtin_open(self._path(filename), "rb") as fi:
+            if rest:
+                fi.seek(rest)
+            while True:
+                block = fi.read(blocksize)
+                if not block:
+                    break
+                self.server.received += len(block)
+                callback(block)
+
+    def retrlines(self, cmd, callback):
+        filename = cmd.split(" ", 1)[1]
+        with _builtin_open(self._path(filename), "rb") as fi:
+            for line in fi:
+                self.server.received += len(line)
+                callback(line.rstrip("\r\n"))
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Station(object):
+    """
+    Simulated station, honcho is patched to use it while open
+
+    With fast, sleeps over FAST_SLEEP_LIMIT are skipped (and accounted for in station
+    time) instead of waited
+    """
+
+    def __init__(
+        self,
+        fast=False,
+        voltage=12.8,
+        seabird_ids=(b"05", b"06", b"07"),
+        aquadopp_ids=(b"20",),
+        signal=5,
+    ):
+        self.fast = fast
+        self.voltage = voltage
+        self.seabird_ids = seabird_ids
+        self.aquadopp_ids = aquadopp_ids
+        self.signal = signal
+        self.is_open = False
+        self.skipped = 0
+        self.tasks = []
+        self.powered_seconds = dict((component, 0) for component in GPIO)
+        self._powered_since = {}
+        self._lock = threading.Lock()
+        self._patches = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # Clock
+
+    def now(self):
+        return _time.time() + self.skipped
+
+    def sleep(self, seconds, limit=FAST_SLEEP_LIMIT):
+        if self.fast and seconds > limit:
+            with self._lock:
+                self.skipped += max(seconds - FAST_SLEEP, 0)
+            _time.sleep(min(seconds, FAST_SLEEP))
+        else:
+            _time.sleep(seconds)
+
+    # Power
+
+    def set_voltage(self, voltage):
+        self.voltage = voltage
+        self.registers[1].values[4] = int((voltage - 0.21706913) / 0.0063926)
+
+    def is_powered(self, components):
+        return all(component in self._powered_since for component in components)
+
+    def _power_changed(self, index, old_value, new_value):
+        now = self.now()
+        for component in GPIO:
+            if GPIO_CONFIG[component]["index"] != index:
+                continue
+            mask = GPIO_CONFIG[component]["mask"]
+            if new_value & mask and not old_value & mask:
+                self._powered_since[component] = now
+            elif old_value & mask and not new_value & mask:
+                self.powered_seconds[component] += now - self._powered_since.pop(
+                    component
+                )
+
+    # Setup
+
+    def _path(self, path):
+        if path.startswith(STATION_ROOT + "/honcho/"):
+            return os.path.join(REPO_ROOT, path[len(STATION_ROOT) + 1 :])
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def _honcho_modules(self):
+        return [
+            module
+            for name, module in sys.modules.items()
+            if module is not None and (name == "honcho" or name.startswith("honcho."))
+        ]
+
+    def _patch_attribute(self, module, name, value):
+        sentinel = object()
+        self._patches.append((module, name, getattr(module, name, sentinel), sentinel))
+        setattr(module, name, value)
+
+    def _patch(self, name, value):
+        """
+        Patch config value name wherever honcho has bound it, including argument
+        defaults (unless None, which can't be told apart from other None defaults)
+        """
+        original = getattr(config, name)
+        for module in self._honcho_modules():
+            if name in vars(module) and vars(module)[name] is original:
+                self._patch_attribute(module, name, value)
+            if original is None:
+                continue
+            for _, function in inspect.getmembers(module, inspect.isfunction):
+                defaults = function.__defaults__ or ()
+                if function.__module__ == module.__name__ and any(
+                    default is original for default in defaults
+                ):
+                    self._patch_attribute(
+                        function,
+                        "__defaults__",
+                        tuple(value if d is original else d for d in defaults),
+                    )
+
+    def _open(self, filepath, mode="r", *args):
+        for registers in self.registers:
+            if filepath in (registers.index_path, registers.data_path):
+                return registers.open(filepath, mode)
+
+        return _builtin_open(filepath, mode, *args)
+
+    def open(self):
+        from honcho.tasks import import_task
+        from honcho.util import ensure_all_dirs
+
+        for name in SIMULATED_TASKS + ("power",):
+            import_task(name)
+
+        self.root = tempfile.mkdtemp(prefix="station")
+        self.is_open = True
+        self.iridium = IridiumDevice(self, self.signal)
+        self.imm = IMMDevice(self, self.seabird_ids, self.aquadopp_ids)
+        self.wxt = WXTDevice(self, config.WXT_INTERVAL)
+        self.gps = GPSDevice(self)
+        self.ftp = FTPStandIn(os.path.join(self.root, "ftp"))
+        self.registers = [
+            IndexedRegisters(
+                self._path(config.POWER_INDEX_DEVICE),
+                self._path(config.POWER_DATA_DEVICE),
+                {0: 0, 1: 0, 2: 0},
+                on_change=self._power_changed,
+            ),
+            IndexedRegisters(
+                self._path(config.SUPPLY_INDEX_DEVICE),
+                self._path(config.SUPPLY_DATA_DEVICE),
+                {0: 512, 1: 128},
+            ),
+        ]
+        self.set_voltage(self.voltage)
+
+        for name, value in vars(config).items():
+            if isinstance(value, str) and value.startswith(("/media/", "/sys/")):
+                self._patch(name, self._path(value))
+        self._patch("NETRC_FILEPATH", self._path(config.NETRC_FILEPATH))
+        self._patch(
+            "DIRECTORIES_TO_MONITOR",
+            dict(
+                (key, self._path(value))
+                for key, value in config.DIRECTORIES_TO_MONITOR.items()
+            ),
+        )
+        self._patch("SBD_PORT", self.iridium.port)
+        self._patch("IMM_PORT", self.imm.port)
+        self._patch("WXT_PORT", self.wxt.port)
+        self._patch("GPS_PORT", self.gps.port)
+        self._patch("SEABIRD_IDS", list(self.seabird_ids))
+        self._patch("AQUADOPP_IDS", list(self.aquadopp_ids))
+
+        for module in self._honcho_modules():
+            if getattr(module, "sleep", None) is _time.sleep:
+                self._patch_attribute(module, "sleep", self.sleep)
+        import honcho.core.ftp
+        import honcho.core.gpio
+        import honcho.core.onboard
+        import honcho.tasks.gps
+
+        self._patch_attribute(honcho.core.ftp, "FTP", self.ftp)
+        self._patch_attribute(honcho.core.gpio, "open", self._open)
+        self._patch_attribute(honcho.core.onboard, "open", self._open)
+        self._patch_attribute(honcho.tasks.gps, "set_datetime", lambda timestamp: None)
+        honcho.core.gpio.all_off()
+        honcho.core.gpio._registers.clear()
+
+        # Config now points into the simulation
+        ensure_all_dirs()
+        for path, content in (
+            (config.HUMIDITY_DATA_DEVICE, "0x1f40"),
+            (config.TEMPERATURE_DATA_DEVICE, "0x0fa0"),
+            (config.WATCHDOG_DEVICE, "0x0"),
+        ):
+            self._write(path, content)
+        self._write(
+            config.NETRC_FILEPATH,
+            "machine {0} login amigos password amigos\n".format(config.FTP_HOST),
+        )
+        os.chmod(config.NETRC_FILEPATH, 0o600)
+
+        self.start = self.now()
+        self.wall_start = _time.time()
+
+    def _write(self, path, content):
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with _builtin_open(path, "w") as f:
+            f.write(content)
+
+    def close(self):
+        self.is_open = False
+        for module, name, value, sentinel in reversed(self._patches):
+            if value is sentinel:
+                delattr(module, name)
+            else:
+                setattr(module, name, value)
+        self._patches = []
+
+        for device in (self.iridium, self.imm, self.wxt, self.gps):
+            device.close()
+        shutil.rmtree(self.root)
+
+    # Running
+
+    def _execution_count(self, name):
+        log_filepath = config.EXECUTION_LOG_FILEPATH("honcho.tasks." + name)
+        if not os.path.exists(log_filepath):
+            return 0
+        with _builtin_open(log_filepath, "r") as f:
+            return json.load(f).get("successes", 0)
+
+    def run(self, name):
+        from honcho.tasks.power import voltage_check
+
+        if name not in SIMULATED_TASKS:
+            raise Exception("Task {0} is not simulated".format(name))
+
+        # The schedule loop checks the supply before running pending tasks
+        voltage_check()
+        self._execute(name)
+
+    def _execute(self, name):
+        from honcho.tasks import import_task
+
+        successes = self._execution_count(name)
+        start = self.now()
+        import_task(name).execute()
+        seconds = self.now() - start
+        self.tasks.append((name, seconds, self._execution_count(name) > successes))
+
+        return seconds
+
+    def run_schedule(self, schedule, hours, exact=False, voltages=None):
+        """
+        Run schedule ((spec, task) pairs) for hours with the honcho.core.sched loop on
+        a virtual clock, which tasks advance by the station time they take and
+        standbys (including low voltage ones) skip ahead. voltages maps hours into the
+        run to the supply voltage from then on. Returns the clock.
+        """
+        import honcho.tasks.power
+        from honcho.core.sched import (
+            VirtualClock,
+            load_schedule,
+            run_schedule,
+            run_schedule_exact,
+            scheduler_clock,
+        )
+        from honcho.tasks.power import voltage_check
+        from honcho.util import total_seconds
+        from schedule.schedule import Scheduler
+
+        for _, name in schedule:
+            if name not in SIMULATED_TASKS:
+                raise Exception("Task {0} is not simulated".format(name))
+
+        start = datetime.now()
+        clock = VirtualClock(start)
+        scheduler = Scheduler()
+        voltages = sorted((voltages or {}).items())
+        self._patch_attribute(honcho.tasks.power, "system_standby", clock.standby)
+
+        def get_execute(name):
+            def execute():
+                clock.sleep(self._execute(name))
+
+            return execute
+
+        def check_voltage():
+            hours_in = total_seconds(clock.now() - start) / 3600.0
+            for hour, voltage in voltages:
+                if hours_in >= hour:
+                    self.set_voltage(voltage)
+            return voltage_check()
+
+        run_loop = run_schedule_exact if exact else run_schedule
+        with scheduler_clock(clock):
+            load_schedule(scheduler, schedule, get_execute)
+            run_loop(
+                scheduler,
+                clock,
+                check_voltage=check_voltage,
+                until=start + timedelta(hours=hours),
+            )
+
+        return clock
+
+    def report(self):
+        now = self.now()
+        powered_seconds = dict(self.powered_seconds)
+        for component, since in self._powered_since.items():
+            powered_seconds[component] += now - since
+
+        return {
+            "wall_seconds": _time.time() - self.wall_start,
+            "station_seconds": now - self.start,
+            "tasks": self.tasks,
+            "ftp_sessions": self.ftp.sessions,
+            "powered_seconds": dict(
+                (component, seconds)
+                for component, seconds in powered_seconds.items()
+                if seconds
+            ),
+            "link_bytes": {
+                "sbd": {
+                    "sent": sum(len(message) for message in self.iridium.messages),
+                    "received": 0,
+                },
+                "ftp": {"sent": self.ftp.sent, "received": self.ftp.received},
+                "iridium_serial": {
+                    "sent": self.iridium.sent,
+                    "received": self.iridium.received,
+                },
+                "imm_serial": {"sent": self.imm.sent, "received": self.imm.received},
+                "wxt_serial": {"sent": self.wxt.sent, "received": self.wxt.received},
+                "gps_serial": {"sent": self.gps.sent, "received": self.gps.received},
+            },
+        }
+
+
+def schedule_tasks():
+    from honcho.core.sched import select_schedule
+
+    names = []
+    for _, name in config.SCHEDULES[select_schedule(datetime.now())]:
+        if name in SIMULATED_TASKS and name not in names:
+            names.append(name)
+
+    return names
+
+
+def print_report(report):
+    print("wall time: {0:.1f} s".format(report["wall_seconds"]))
+    print("station time: {0:.1f} s".format(report["station_seconds"]))
+    print("tasks:")
+    for name, seconds, success in report["tasks"]:
+        print(
+            "    {0}: {1:.1f} s {2}".format(
+                name, seconds, "ok" if success else "FAILED"
+            )
+        )
+    print("ftp sessions: {0}".format(report["ftp_sessions"]))
+    print("powered time:")
+    for component, seconds in sorted(report["powered_seconds"].items()):
+        print("    {0}: {1:.1f} s".format(component, seconds))
+    print("bytes sent/received:")
+    for link, counts in sorted(report["link_bytes"].items()):
+        print("    {0}: {1}/{2}".format(link, counts["sent"], counts["received"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fast", help="Skip sleeps", action="store_true", dest="fast")
+    parser.add_argument("tasks", nargs="*", help="Tasks to run (default schedule)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with Station(fast=args.fast) as station:
+        for name in args.tasks or schedule_tasks():
+            station.run(name)
+        print_report(station.report())
@@ -0,0 +1,306 @@
+import json
+import os
+import subprocess
+from fractions import Fraction
+
+import honcho.tasks.camera as camera
+import pytest
+from honcho.config import LOOK_PTZ, LOOKS, PTZ
+
+
+@pytest.fixture
+def camera_mocks(tmpdir, mocker):
+    data_dir = tmpdir.mkdir("CAM")
+    mocker.patch("honcho.tasks.camera.DATA_DIR", lambda tag: str(data_dir))
+    mocker.patch(
+        "honcho.tasks.camera.CAMERA_FINGERPRINTS_FILEPATH",
+        str(tmpdir.join("camera_fingerprints.json")),
+    )
+    mocker.patch(
+        "honcho.tasks.common.EXECUTION_LOG_FILEPATH",
+        lambda name: str(tmpdir.join(name + ".json")),
+    )
+    mocker.patch("honcho.tasks.camera.LOOK_SERIES", ("MIRROR", "DOWN"))
+    mocker.patch("honcho.tasks.camera.powered")
+    mocker.patch("honcho.tasks.camera.warm_up")
+    mocker.patch("honcho.tasks.camera.get_queue", return_value=[])
+    mocker.patch("honcho.tasks.camera.image_fingerprint", return_value=[100] * 64)
+
+    client = mocker.patch("honcho.tasks.camera.CameraClient").return_value
+    client.get_ptz.return_value = PTZ(pan=0, tilt=0, zoom=0)
+
+    def snapshot(filepath):
+        with open(filepath, "wb") as f:
+            f.write(b"x" * 100000)
+
+    client.snapshot.side_effect = snapshot
+
+    waits = []
+
+    def start_process_image(input_filepath, output_filepath, crop=None, scale=None):
+        with open(output_filepath, "wb") as f:
+            f.write(b"x" * 1000)
+        wait = mocker.Mock()
+        waits.append(wait)
+        return wait
+
+    mocker.patch(
+        "honcho.tasks.camera.start_process_image", side_effect=start_process_image
+    )
+
+    return {
+        "data_dir": data_dir,
+        "client": client,
+        "waits": waits,
+        "queue": mocker.patch("honcho.tasks.camera.queue_filepaths"),
+        "archive": mocker.patch("honcho.tasks.camera.archive_filepaths"),
+    }
+
+
+def queued_filenames(queue_mock):
+    filepaths = queue_mock.call_args[0][0]
+    return sorted(os.path.basename(filepath) for filepath in filepaths)
+
+
+def test_execute(camera_mocks):
+    camera.execute()
+
+    assert camera_mocks["client"].snapshot.call_count == 2
+    assert all(wait.call_count == 1 for wait in camera_mocks["waits"])
+    filenames = queued_filenames(camera_mocks["queue"])
+    assert [filename.split("_")[-2:] for filename in filenames] == [
+        ["DOWN", "low.jpg"],
+        ["MIRROR", "low.jpg"],
+    ]
+    assert camera_mocks["queue"].call_args[1]["postfix"] == "CAM"
+    assert len(camera_mocks["archive"].call_args[0][0]) == 2
+    assert camera_mocks["data_dir"].listdir() == []
+    assert sorted(camera.load_fingerprints()) == ["DOWN", "MIRROR"]
+
+    # Same views again only queue thumbnails
+    camera.execute()
+
+    filenames = queued_filenames(camera_mocks["queue"])
+    assert all(filename.endswith("_thumb.jpg") for filename in filenames)
+
+
+def execution_log(tmpdir):
+    with open(str(tmpdir.join("honcho.tasks.camera.json")), "r") as f:
+        return json.load(f)
+
+
+def test_execute_pipelined(camera_mocks, mocker):
+    mocker.patch("honcho.tasks.camera.CAMERA_PIPELINE", True)
+    waits = camera_mocks["waits"]
+    snapshot = camera_mocks["client"].snapshot.side_effect
+
+    def snapshot_while_processing(filepath):
+        # Earlier looks are still processing while the camera moves on
+        assert not any(wait.called for wait in waits)
+        snapshot(filepath)
+
+    camera_mocks["client"].snapshot.side_effect = snapshot_while_processing
+    camera.execute()
+
+    assert len(waits) == 2
+    assert all(wait.call_count == 1 for wait in waits)
+    assert camera_mocks["queue"].called
+
+
+def test_execute_processing_fails(camera_mocks, mocker, tmpdir, caplog):
+    mocker.patch("honcho.tasks.camera.CAMERA_PIPELINE", True)
+    start_process_image = camera.start_process_image.side_effect
+
+    def start_failing(*args, **kwargs):
+        wait = start_process_image(*args, **kwargs)
+        wait.side_effect = subprocess.CalledProcessError(1, ["djpeg"])
+        return wait
+
+    camera.start_process_image.side_effect = start_failing
+    camera.execute()
+
+    # All processing is waited for, then the failure raised
+    assert all(wait.call_count == 1 for wait in camera_mocks["waits"])
+    assert not camera_mocks["queue"].called
+    assert execution_log(tmpdir)["failures"] == 1
+    assert "CalledProcessError" in caplog.text
+
+
+def test_execute_series_fails(camera_mocks, mocker, tmpdir, caplog):
+    mocker.patch("honcho.tasks.camera.CAMERA_PIPELINE", True)
+    snapshot = camera_mocks["client"].snapshot.side_effect
+
+    def snapshot_once(filepath):
+        if camera_mocks["waits"]:
+            raise Exception("Snapshot failed")
+        snapshot(filepath)
+
+    camera_mocks["client"].snapshot.side_effect = snapshot_once
+    camera.execute()
+
+    # Processing of the first look is not left running
+    assert [wait.call_count for wait in camera_mocks["waits"]] == [1]
+    assert not camera_mocks["queue"].called
+    assert execution_log(tmpdir)["failures"] == 1
+    assert "Snapshot failed" in caplog.text
+
+
+@pytest.fixture
+def sized_encode(mocker):
+    # Encoded size grows with quality and scale, 1000 bytes per quality at full size
+    decode = mocker.patch(
+        "honcho.tasks.camera.decode_image",
+        side_effect=lambda input_filepath, crop, scale: Fraction(scale),
+    )
+    mocker.patch(
+        "honcho.tasks.camera.encode_image",
+        side_effect=lambda decoded, quality: b"x" * int(quality * 1000 * decoded),
+    )
+
+    return decode
+
+
+def test_fit_image_quality(sized_encode, tmpdir):
+    output_filepath = tmpdir.join("low.jpg")
+
+    assert camera.fit_image("full.jpg", str(output_filepath), None, None, 40500) == (
+        "1/1",
+        40,
+    )
+    assert output_filepath.size() == 40000
+    assert sized_encode.call_count == 1
+
+
+def test_fit_image_scale_ladder(sized_encode, tmpdir):
+    output_filepath = str(tmpdir.join("low.jpg"))
+
+    # Too big at 1/2 even at the lowest quality, fits at 3/8
+    assert camera.fit_image("full.jpg", output_filepath, None, "1/2", 8000) == (
+        "3/8",
+        21,
+    )
+    assert [call[0][2] for call in sized_encode.call_args_list] == ["1/2", "3/8"]
+
+    # Nothing fits, smallest scale at the lowest quality
+    assert camera.fit_image("full.jpg", output_filepath, None, "1/2", 100) == (
+        "1/8",
+        camera.CAMERA_MIN_QUALITY,
+    )
+
+
+def test_look_target_bytes(tmpdir, mocker):
+    mocker.patch("honcho.tasks.camera.UPLOAD_SESSION_BYTES", 100000)
+    ahead = tmpdir.join("2020_01_01_00_00_00_PWR.tgz")
+    ahead.write("x" * 40000)
+    behind = tmpdir.join("2020_01_01_00_00_00_DTS.tgz.part0")
+    behind.write("x" * 50000)
+    get_queue = mocker.patch(
+        "honcho.tasks.camera.get_queue", return_value=[str(ahead), str(behind)]
+    )
+
+    # Only what uploads ahead of camera images counts
+    assert camera.look_target_bytes(2) == 30000
+    assert camera.look_target_bytes(20) == camera.CAMERA_MIN_TARGET_BYTES
+    get_queue.return_value = []
+    assert camera.look_target_bytes(1) == camera.CAMERA_MAX_TARGET_BYTES
+
+
+def test_order_looks():
+    start = LOOK_PTZ[LOOKS.DOWN]["ptz"]
+
+    assert camera.order_looks((LOOKS.MIRROR, LOOKS.SOUTH, LOOKS.DOWN), start) == [
+        LOOKS.DOWN,
+        LOOKS.MIRROR,
+        LOOKS.SOUTH,
+    ]
+    # East and west are as far from down, ties keep the configured order
+    assert camera.order_looks((LOOKS.WEST, LOOKS.DOWN, LOOKS.EAST), start) == [
+        LOOKS.DOWN,
+        LOOKS.WEST,
+        LOOKS.EAST,
+    ]
+    assert camera.order_looks((LOOKS.EAST, LOOKS.DOWN, LOOKS.WEST), start) == [
+        LOOKS.DOWN,
+        LOOKS.EAST,
+        LOOKS.WEST,
+    ]
+
+
+@pytest.fixture
+def ptz_client(mocker):
+    mocker.patch("honcho.tasks.camera.sleep")
+    # Each status poll takes a second
+    mocker.patch("honcho.tasks.camera.time", side_effect=range(100))
+    client = camera.CameraClient()
+    mocker.patch.object(client, "get_status")
+
+    return client
+
+
+def test_wait_for_ptz_settles(ptz_client):
+    target = PTZ(pan=0.5, tilt=0.5, zoom=0)
+    ptz_client.get_status.side_effect = [
+        (PTZ(pan=0.2, tilt=0.4, zoom=0), True),
+        (PTZ(pan=0.495, tilt=0.5, zoom=0), True),
+        (PTZ(pan=0.495, tilt=0.5, zoom=0), False),
+    ]
+
+    assert ptz_client.wait_for_ptz(target, tolerance=0.01, timeout=5)
+    assert ptz_client.get_status.call_count == 3
+
+
+def test_wait_for_ptz_timeout(ptz_client):
+    target = PTZ(pan=0.5, tilt=0.5, zoom=0)
+    # Stopped, but never within tolerance
+    ptz_client.get_status.return_value = (PTZ(pan=0.48, tilt=0.5, zoom=0), False)
+
+    assert not ptz_client.wait_for_ptz(target, tolerance=0.01, timeout=5)
+    assert ptz_client.get_status.call_count == 5
+
+
+def test_fingerprint_change():
+    assert camera.fingerprint_change([10] * 64, [10] * 64) == 0
+    assert camera.fingerprint_change([10] * 32 + [20] * 32, [10] * 64) == 5
+
+
+@pytest.mark.parametrize(
+    "fingerprint, previous, full",
+    [
+        # First capture of the look
+        ([100] * 64, None, True),
+        ([100] * 64, [100] * 63 + [90], False),
+        ([100] * 64, [90] * 64, True),
+        # Dark, even when new
+        ([5] * 64, None, False),
+    ],
+)
+def test_select_upload(fingerprint, previous, full, mocker):
+    mocker.patch("honcho.tasks.camera.image_fingerprint", return_value=fingerprint)
+    process_image = mocker.patch("honcho.tasks.camera.process_image")
+    fingerprints = {} if previous is None else {"DOWN": previous}
+
+    filepath = camera.select_upload("DOWN", "/data/t_DOWN_low.jpg", fingerprints)
+
+    if full:
+        assert filepath == "/data/t_DOWN_low.jpg"
+        assert fingerprints["DOWN"] == fingerprint
+        assert not process_image.called
+    else:
+        assert filepath == "/data/t_DOWN_thumb.jpg"
+        assert fingerprints.get("DOWN") == previous
+        process_image.assert_called_once_with(
+            "/data/t_DOWN_low.jpg", filepath, scale=camera.CAMERA_THUMBNAIL_SCALE
+        )
+
+
+def test_save_fingerprints(tmpdir, mocker):
+    filepath = tmpdir.join("camera_fingerprints.json")
+    mocker.patch("honcho.tasks.camera.CAMERA_FINGERPRINTS_FILEPATH", str(filepath))
+
+    camera.save_fingerprints({"DOWN": [100] * 64})
+    assert camera.load_fingerprints() == {"DOWN": [100] * 64}
+    assert tmpdir.listdir() == [filepath]
+
+    # Left corrupt by an older version
+    filepath.write('{"DOWN": [10')
+    assert camera.load_fingerprints() == {}
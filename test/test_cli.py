@@ -3,3 +3,10 @@ from honcho.cli import build_parser
 
 def test_cli_smoke():
     build_parser()
+
+
+def test_schedule_summary(capsys):
+    args = build_parser().parse_args(["schedule", "--summary"])
+    args.handler(args)
+
+    assert capsys.readouterr().out.startswith("Schedule: ")
@@ -7,8 +7,8 @@ from honcho.config import ARCHIVE_DIR, DATA_TAGS, LOG_DIR
 
 
 @pytest.fixture(autouse=True)
-def skip_sleep(mocker):
-    mocker.patch("honcho.tasks.crx.sleep", mocker.stub())
+def skip_warm_up(mocker):
+    mocker.patch("honcho.core.gpio.sleep", mocker.stub())
 
 
 @pytest.fixture
@@ -64,7 +64,7 @@ def crx_mock(mocker):
 def test_get_last_sample(crx_mock, mocker):
     log_serialized = mocker.MagicMock()
     queue_sbd = mocker.MagicMock()
-    mocker.patch("honcho.tasks.crx.sleep", mocker.stub())
+    mocker.patch("honcho.tasks.crx.warm_up", mocker.stub())
     mocker.patch("honcho.tasks.crx.powered", mocker.stub())
     mocker.patch("honcho.tasks.crx.connection", crx_mock)
     mocker.patch("honcho.tasks.crx.log_serialized", log_serialized)
@@ -110,7 +110,7 @@ def test_get_last_sample(crx_mock, mocker):
 def test_execute_smoke(fs, crx_mock, mocker):
     log_serialized = mocker.MagicMock()
     queue_sbd = mocker.MagicMock()
-    mocker.patch("honcho.tasks.crx.sleep", mocker.stub())
+    mocker.patch("honcho.tasks.crx.warm_up", mocker.stub())
     mocker.patch("honcho.tasks.crx.powered", mocker.stub())
     mocker.patch("honcho.tasks.crx.connection", crx_mock)
     mocker.patch("honcho.tasks.crx.log_serialized", log_serialized)
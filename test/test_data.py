@@ -0,0 +1,83 @@
+import os
+import tarfile
+from datetime import datetime
+from hashlib import md5
+from io import BytesIO
+
+import honcho.tasks.seabird as seabird
+import pytest
+from honcho.core.data import (binary_schema, chunk_tarball, compute_checksum,
+                              decode_binary, encode_binary, serialize)
+
+
+def test_binary_roundtrip():
+    sample = seabird.SeabirdSample(
+        timestamp=datetime(2019, 12, 31, 1, 47, 11),
+        device_id="05",
+        conductivity=3.00008,
+        temperature=-1.0374,
+        pressure=713.998,
+        salinity=34.6688,
+    )
+    schema = binary_schema(seabird.DATA_KEYS, seabird.CONVERSION_TO_STRING)
+    serialized = serialize(sample, seabird.CONVERSION_TO_STRING)
+
+    encoded = encode_binary(serialized, schema)
+    decoded, pos = decode_binary(encoded, schema)
+
+    assert decoded == serialized
+    assert pos == len(encoded)
+    assert len(encoded) < len(serialized) / 2
+
+
+def test_chunk_tarball(tmpdir, mocker):
+    mocker.patch("honcho.core.data.FTP_CHUNK_SIZE", 1000)
+    filepaths = []
+    for i in range(3):
+        filepath = tmpdir.join("data{0}.bin".format(i))
+        filepath.write(os.urandom(4000), mode="wb")
+        filepaths.append(str(filepath))
+    tarball_filepath = str(tmpdir.mkdir("queue").join("data.tgz"))
+
+    chunk_filepaths, parity_filepaths, checksum, checksums = chunk_tarball(
+        filepaths, tarball_filepath, parity_group=5
+    )
+
+    assert not os.path.exists(tarball_filepath)
+    assert chunk_filepaths[0].endswith("data.tgz.part00")
+    assert all(os.path.getsize(filepath) == 1000 for filepath in chunk_filepaths[:-1])
+    joined = b"".join(open(filepath, "rb").read() for filepath in chunk_filepaths)
+    assert md5(joined).hexdigest() == checksum
+    assert sorted(checksums) == sorted(chunk_filepaths + parity_filepaths)
+    assert checksums[chunk_filepaths[0]] == compute_checksum(chunk_filepaths[0])
+    assert checksums[parity_filepaths[0]] == compute_checksum(parity_filepaths[0])
+    with tarfile.open(fileobj=BytesIO(joined), mode="r:gz") as tar:
+        assert tar.extractfile("data2.bin").read() == open(filepaths[2], "rb").read()
+
+    # Any one chunk of a group is the XOR of its parity and the others
+    assert len(parity_filepaths) == (len(chunk_filepaths) + 4) // 5
+    lost = len(chunk_filepaths) - 1
+    group = chunk_filepaths[lost // 5 * 5 : lost // 5 * 5 + 5]
+    rebuilt = bytearray(open(parity_filepaths[-1], "rb").read())
+    for filepath in group:
+        if filepath != chunk_filepaths[lost]:
+            for i, byte in enumerate(bytearray(open(filepath, "rb").read())):
+                rebuilt[i] ^= byte
+    lost_chunk = open(chunk_filepaths[lost], "rb").read()
+    assert bytes(rebuilt[: len(lost_chunk)]) == lost_chunk
+
+
+def test_chunk_tarball_failure(tmpdir, mocker):
+    mocker.patch("honcho.core.data.FTP_CHUNK_SIZE", 1000)
+    filepath = tmpdir.join("data.bin")
+    filepath.write(os.urandom(40000), mode="wb")
+    queue_dir = tmpdir.mkdir("queue")
+
+    # Read error part way through, after chunks were written
+    with pytest.raises(OSError):
+        chunk_tarball(
+            [str(filepath), str(tmpdir.join("missing.bin"))],
+            str(queue_dir.join("data.tgz")),
+            parity_group=5,
+        )
+    assert queue_dir.listdir() == []
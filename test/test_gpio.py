@@ -0,0 +1,117 @@
+from io import BytesIO
+
+import honcho.core.gpio as gpio
+import pytest
+from honcho.config import GPIO, GPIO_CONFIG, POWER_DATA_DEVICE, POWER_INDEX_DEVICE
+
+
+class FakeRegisters(object):
+    """
+    Power registers behind the sysfs index/data device pair
+    """
+
+    def __init__(self):
+        self.values = {0: 0, 1: 0, 2: 0}
+        self.index = 0
+        self.operations = 0
+
+    def open(self, filepath, mode):
+        self.operations += 1
+        registers = self
+
+        class Device(BytesIO):
+            def __exit__(self, *args):
+                if "w" in mode and filepath == POWER_INDEX_DEVICE:
+                    registers.index = int(self.getvalue(), 16)
+                elif "w" in mode and filepath == POWER_DATA_DEVICE:
+                    registers.values[registers.index] = int(self.getvalue(), 16)
+
+        if "r" in mode:
+            return Device(hex(self.values[self.index]))
+        return Device()
+
+    def on(self):
+        return set(
+            component
+            for component, config in GPIO_CONFIG.items()
+            if self.values[config["index"]] & config["mask"]
+        )
+
+
+@pytest.fixture
+def registers(mocker):
+    registers = FakeRegisters()
+    mocker.patch("honcho.core.gpio.open", registers.open, create=True)
+    mocker.patch("honcho.core.gpio.HUB_ALWAYS_ON", 0)
+    gpio.all_off()
+    gpio._registers.clear()
+    registers.operations = 0
+
+    yield registers
+
+
+def test_nested_powered(registers):
+    with gpio.powered([GPIO.SER, GPIO.GPS]):
+        with gpio.powered([GPIO.SER, GPIO.IMM]):
+            assert registers.on() == set([GPIO.SER, GPIO.GPS, GPIO.IMM])
+
+        assert registers.on() == set([GPIO.SER, GPIO.GPS])
+
+    assert registers.on() == set()
+
+
+def test_all_off_while_powered(registers):
+    with gpio.powered([GPIO.SER, GPIO.GPS]):
+        gpio.all_off()
+
+    assert registers.on() == set()
+
+
+def test_keep_warm(registers, mocker):
+    mocker.patch("honcho.core.gpio.time", return_value=100)
+    with gpio.powered([GPIO.HUB, GPIO.CRX], keep_warm=60):
+        pass
+
+    assert registers.on() == set([GPIO.HUB, GPIO.CRX])
+    gpio.release_idle()
+    assert registers.on() == set([GPIO.HUB, GPIO.CRX])
+
+    mocker.patch("honcho.core.gpio.time", return_value=161)
+    gpio.release_idle()
+    assert registers.on() == set()
+
+
+def test_warm_up(mocker):
+    sleep = mocker.patch("honcho.core.gpio.sleep")
+    mocker.patch.dict("honcho.core.gpio._on_since", {GPIO.HUB: 100, GPIO.CAM: 130})
+    mocker.patch("honcho.core.gpio.time", return_value=150)
+
+    gpio.warm_up([GPIO.HUB, GPIO.CAM], 60)
+
+    sleep.assert_called_once_with(40)
+
+
+def test_switch_batches_registers(registers):
+    gpio.switch(on=[GPIO.IRD, GPIO.RTR, GPIO.HUB])
+
+    assert registers.on() == set([GPIO.IRD, GPIO.RTR, GPIO.HUB])
+    assert registers.operations == 3
+
+    assert gpio.is_on(GPIO.HUB)
+    assert not gpio.is_on(GPIO.CAM)
+    assert registers.operations == 3
+
+
+def test_on_since_reset_when_off(registers, mocker):
+    mocker.patch("honcho.core.gpio.time", return_value=100)
+    gpio.turn_on(GPIO.CAM)
+    # Turned off outside this process
+    registers.values[GPIO_CONFIG[GPIO.CAM]["index"]] = 0
+
+    mocker.patch("honcho.core.gpio.time", return_value=200)
+    gpio.turn_on(GPIO.CAM)
+    assert gpio._on_since[GPIO.CAM] == 200
+
+    mocker.patch("honcho.core.gpio.time", return_value=300)
+    gpio.turn_on(GPIO.CAM)
+    assert gpio._on_since[GPIO.CAM] == 200
@@ -1,4 +1,5 @@
 import os
+from contextlib import contextmanager
 
 import honcho.core.imm as imm
 import pytest
@@ -40,3 +41,34 @@ def test_force_capture_line_smoke(imm_mock):
 
 def test_send_wakeup_tone_smoke(imm_mock):
     imm.send_wakeup_tone(imm_mock)
+
+
+def test_shared_session(mocker):
+    import honcho.tasks.imm as imm_task
+
+    sessions = []
+
+    @contextmanager
+    def imm_components():
+        yield
+
+    @contextmanager
+    def active_line():
+        sessions.append("serial")
+        yield "serial"
+
+    mocker.patch("honcho.tasks.imm.imm_components", imm_components)
+    mocker.patch("honcho.tasks.imm.active_line", active_line)
+    seabird_poll = mocker.patch(
+        "honcho.tasks.seabird.poll_recent_samples", side_effect=Exception("no reply")
+    )
+    aquadopp_poll = mocker.patch(
+        "honcho.tasks.aquadopp.poll_recent_samples", return_value=["sample"]
+    )
+
+    result = imm_task.get_recent_samples(["06"], ["20"], 6, 1)
+
+    assert sessions == ["serial"]
+    seabird_poll.assert_called_once_with("serial", ["06"], 6)
+    aquadopp_poll.assert_called_once_with("serial", ["20"], 1)
+    assert result == (None, ["sample"])
@@ -4,9 +4,11 @@ from datetime import datetime
 from math import ceil
 
 import pytest
-from honcho.config import SBD_MAX_SIZE, SBD_QUEUE_FILENAME
+from honcho.config import DATA_TAGS, SBD_MAX_SIZE, SBD_QUEUE_FILENAME, SBD_RECORD_SEP
 from honcho.core.iridium import message_size
-from honcho.tasks.sbd import clear_queue, queue_sbd, send, send_queue
+from honcho.tasks.sbd import (build_queue, clear_queue, is_binary, pack_queue,
+                              queue_sbd, send, send_queue, train_dictionary,
+                              unpack_message)
 
 
 @pytest.fixture(autouse=True)
@@ -99,6 +101,77 @@ def test_send_queue(tmpdir, sbd_mock, mocker):
     assert not filepath.exists()
 
 
+def test_pack_queue(tmpdir, mocker):
+    mocker.patch("honcho.tasks.sbd.SBD_QUEUE_DIR", str(tmpdir))
+
+    records = ["tag,{0:03d},".format(i) + "x" * 90 for i in range(50)]
+    for i, record in enumerate(records):
+        tmpdir.join("{0:03d}_tag".format(i)).write(record)
+    tmpdir.join("999_tag").write("tag,bad" + SBD_RECORD_SEP + "record")
+
+    packed = pack_queue(build_queue())
+
+    # Records fill messages in order, unpackable record sent alone
+    assert len(packed) == 4
+    assert all(message_size(message) <= SBD_MAX_SIZE for message, _ in packed)
+    unpacked = [el for message, _ in packed[:-1] for el in unpack_message(message)]
+    assert unpacked == records
+    assert packed[-1][1] == [str(tmpdir.join("999_tag"))]
+
+
+def test_pack_queue_binary(tmpdir, mocker):
+    mocker.patch("honcho.tasks.sbd.SBD_QUEUE_DIR", str(tmpdir))
+    mocker.patch("honcho.tasks.sbd.SBD_BINARY_TAGS", (DATA_TAGS.SBD,))
+
+    records = [
+        "SBD,2019-12-31T01:47:11,05,3.00008,1.0374,713.998,34.6688",
+        "SBD,2019-12-31T01:47:11,06,3.00027,1.0386,715.494,34.6690",
+        "GGA,not,a,binary,tag",
+        "SBD,malformed",
+    ]
+    for i, record in enumerate(records):
+        tmpdir.join("{0:03d}_tag".format(i)).write(record)
+
+    packed = pack_queue(build_queue())
+
+    assert len(packed) == 2
+    binary, text = packed if is_binary(packed[0][0]) else packed[::-1]
+    assert unpack_message(binary[0]) == records[:2]
+    assert unpack_message(text[0]) == records[2:]
+
+
+def test_pack_queue_compressed(tmpdir, mocker):
+    queue_dir, data_dir = tmpdir.mkdir("queue"), tmpdir.mkdir("data")
+    mocker.patch("honcho.tasks.sbd.SBD_QUEUE_DIR", str(queue_dir))
+    mocker.patch(
+        "honcho.tasks.sbd.DATA_LOG_FILENAME", lambda tag: str(data_dir.join(tag))
+    )
+    mocker.patch(
+        "honcho.tasks.sbd.SBD_DICTIONARY_FILEPATH",
+        lambda version: str(tmpdir.join("{0}.dict".format(version))),
+    )
+    mocker.patch("honcho.tasks.sbd.SBD_DICTIONARY_VERSION", 1)
+    mocker.patch("honcho.tasks.sbd.queue_filepaths", mocker.stub())
+
+    row = "2019-12-31T01:{0:02d}:11,{1:02d},3.000{0:02d},1.03{0:02d},713.998,34.6688"
+    data_dir.join(DATA_TAGS.SBD).write(
+        "\n".join(row.format(i, 5 + i % 3) for i in range(60))
+    )
+    train_dictionary(1)
+
+    records = ["SBD," + row.format(i, 5 + i % 3) for i in range(30)]
+    for i, record in enumerate(records):
+        queue_dir.join("{0:03d}_tag".format(i)).write(record)
+
+    packed = pack_queue(build_queue())
+
+    assert len(packed) == 1
+    message, filepaths = packed[0]
+    assert is_binary(message)
+    assert len(message) < message_size(SBD_RECORD_SEP.join(records)) / 3
+    assert unpack_message(message) == records
+
+
 def test_clear_queue(tmpdir, sbd_mock, mocker):
     mocker.patch("honcho.tasks.sbd.SBD_QUEUE_DIR", str(tmpdir))
 
@@ -1,7 +1,8 @@
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
 
 from honcho.config import SCHEDULE_NAMES, SCHEDULE_START_TIMES, SCHEDULES
-from honcho.core.sched import load_schedule, select_schedule
+from honcho.core.sched import load_runtimes, load_schedule, select_schedule, simulate
 from schedule.schedule import Scheduler
 
 
@@ -44,3 +45,42 @@ def test_smoke_load_summer():
 def test_smoke_load_test():
     scheduler = Scheduler()
     load_schedule(scheduler, SCHEDULES[SCHEDULE_NAMES.TEST])
+
+
+def test_simulate():
+    start = datetime(year=2019, month=5, day=1)
+    result = simulate(SCHEDULE_NAMES.WINTER, start, 2, {"upload": 2 * 3600})
+
+    assert result["standbys"] > 0
+    assert all(0 < seconds <= 3600 for seconds in result["hourly_awake_seconds"])
+    assert all(start <= run.start < start + timedelta(days=3) for run in result["runs"])
+    # Upload running for 2 hours delays everything due meanwhile
+    assert any(previous.task == "upload" for previous, _ in result["overlaps"])
+    # Schedule library time is real again
+    assert sys.modules[Scheduler.__module__].datetime.datetime is datetime
+
+
+def test_simulate_exact():
+    start = datetime(year=2019, month=5, day=1)
+    exact = simulate(SCHEDULE_NAMES.WINTER, start, 1, {}, exact=True)
+    polling = simulate(SCHEDULE_NAMES.WINTER, start, 1, {}, exact=False)
+
+    # Jobs not held up by another start on time, not up to a check interval late
+    delayed = set(run for _, run in exact["overlaps"])
+    assert all(
+        run.start == run.scheduled for run in exact["runs"] if run not in delayed
+    )
+    assert sum(exact["hourly_awake_seconds"]) < sum(polling["hourly_awake_seconds"])
+
+    # Gaps longer than MAX_SYSTEM_SLEEP are spent in back to back standbys
+    exact = simulate(SCHEDULE_NAMES.SAFE, start, 2, {}, exact=True)
+    polling = simulate(SCHEDULE_NAMES.SAFE, start, 2, {}, exact=False)
+    assert exact["standbys"] >= polling["standbys"]
+    assert sum(exact["hourly_awake_seconds"]) < sum(polling["hourly_awake_seconds"])
+
+
+def test_load_runtimes(tmpdir):
+    tmpdir.join("honcho.tasks.sbd.log").write('{"success_runtime": 42.0}')
+
+    runtimes = load_runtimes(SCHEDULES[SCHEDULE_NAMES.WINTER], str(tmpdir))
+    assert runtimes == {"sbd": 42.0}
@@ -0,0 +1,74 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+import honcho.config as config
+import pytest
+from honcho.config import GPIO
+from station import Station
+
+
+def test_station_benchmark():
+    with Station(fast=True) as station:
+        for name in ("imm", "weather", "solar", "gps", "sbd"):
+            station.run(name)
+        report = station.report()
+
+    assert [success for _, _, success in report["tasks"]] == [True] * 5
+    assert report["station_seconds"] > report["wall_seconds"]
+    assert report["powered_seconds"][GPIO.IMM] > 0
+    assert report["powered_seconds"][GPIO.SBD] > 0
+    assert report["link_bytes"]["sbd"]["sent"] > 0
+    assert report["link_bytes"]["imm_serial"]["received"] > 0
+
+
+def test_comms_window():
+    with Station(fast=True) as station:
+        orders_dir = os.path.join(station.ftp.root, config.FTP_ORDERS_DIR.lstrip("/"))
+        with open(os.path.join(orders_dir, "hello.sh"), "w") as f:
+            f.write("#!/bin/sh\necho hello\n")
+        station.run("comms")
+        report = station.report()
+        uploaded = os.listdir(station.ftp.root)
+
+    assert report["tasks"][0][2]
+    # Orders fetched and results uploaded over one dial-up
+    assert report["ftp_sessions"] == 1
+    assert any(filename.endswith("_ORD.tgz") for filename in uploaded)
+
+
+def test_comms_window_ftp_down():
+    import honcho.tasks.sbd as sbd
+
+    with Station(fast=True) as station:
+        station.ftp.down = True
+        sbd.queue_sbd("12.8", config.DATA_TAGS.PWR)
+        station.run("comms")
+        report = station.report()
+
+    assert not report["tasks"][0][2]
+    assert report["ftp_sessions"] == 0
+    # Flushed over SBD regardless
+    assert report["link_bytes"]["sbd"]["sent"] > 0
+
+
+@pytest.mark.parametrize("exact", [False, True])
+def test_run_schedule(exact):
+    schedule = (
+        ('scheduler.every().hour.at(":15")', "sbd"),
+        ('scheduler.every().hour.at(":45")', "weather"),
+    )
+    with Station(fast=True) as station:
+        clock = station.run_schedule(schedule, hours=4, exact=exact, voltages={2: 11.0})
+        report = station.report()
+
+    # Only the first two hours run, the low supply puts the station in standby
+    assert Counter(name for name, _, _ in report["tasks"]) == {"sbd": 2, "weather": 2}
+    assert all(success for _, _, success in report["tasks"])
+    assert len(clock.standbys) >= 4
+    low_standbys = [
+        (start, end)
+        for start, end in clock.standbys
+        if end - start >= timedelta(minutes=config.MAX_SYSTEM_SLEEP)
+    ]
+    assert low_standbys
@@ -0,0 +1,258 @@
+import os
+import shutil
+import socket
+import time
+from ftplib import error_perm
+
+import honcho.tasks.upload as upload
+import pytest
+
+
+class FakeFTP(object):
+    """
+    FTP server writing to a directory, dropping the link after drop_after bytes.
+    With binary_size, SIZE is refused in ASCII mode like ProFTPD does.
+    """
+
+    def __init__(self, directory, rest=True, drop_after=None, binary_size=False):
+        self.directory = directory
+        self.rest = rest
+        self.drop_after = drop_after
+        self.binary_size = binary_size
+        self.binary = False
+        self.stored = []
+
+    def voidcmd(self, cmd):
+        self.binary = cmd == "TYPE I"
+
+    def size(self, filename):
+        if self.binary_size and not self.binary:
+            raise error_perm("550 SIZE not allowed in ASCII mode")
+        filepath = os.path.join(self.directory, filename)
+        if not os.path.exists(filepath):
+            raise error_perm("550 No such file")
+        return os.path.getsize(filepath)
+
+    def storbinary(self, cmd, fp, blocksize=8192, callback=None, rest=None):
+        self.binary = True
+        if rest is not None and not self.rest:
+            raise error_perm("502 REST not implemented")
+        self.stored.append(rest)
+        filepath = os.path.join(self.directory, cmd.split(" ", 1)[1])
+        with open(filepath, "r+b" if rest else "wb") as fo:
+            fo.seek(rest or 0)
+            while True:
+                block = fp.read(blocksize)
+                if not block:
+                    break
+                if self.drop_after is not None and fo.tell() >= self.drop_after:
+                    self.drop_after = None
+                    raise socket.error("Connection lost")
+                fo.write(block)
+                if callback is not None:
+                    callback(block)
+
+
+@pytest.fixture
+def upload_dirs(tmpdir, mocker):
+    mocker.patch(
+        "honcho.tasks.upload.UPLOAD_PROGRESS_FILEPATH",
+        str(tmpdir.join("upload_progress.json")),
+    )
+    mocker.patch(
+        "honcho.tasks.upload.FTP_LINK_STATS_FILEPATH",
+        str(tmpdir.join("ftp_link_stats.json")),
+    )
+    mocker.patch(
+        "honcho.tasks.upload.UPLOAD_MANIFEST_FILEPATH",
+        str(tmpdir.join("upload_manifest.json")),
+    )
+    mocker.patch("honcho.tasks.upload.UPLOAD_QUEUE_DIR", str(tmpdir.mkdir("queue")))
+    filepath = tmpdir.join("data.tar.gz")
+    filepath.write(os.urandom(50000), mode="wb")
+
+    return str(filepath), str(tmpdir.mkdir("remote"))
+
+
+def test_resume_upload(upload_dirs):
+    filepath, remote_dir = upload_dirs
+    ftp = FakeFTP(remote_dir, drop_after=20000)
+
+    with pytest.raises(socket.error):
+        upload.upload(filepath, ftp)
+    assert "data.tar.gz" in upload.load_progress()
+
+    upload.upload(filepath, ftp)
+    assert ftp.stored == [None, 24576]
+    with open(filepath, "rb") as fi, open(
+        os.path.join(remote_dir, "data.tar.gz"), "rb"
+    ) as fo:
+        assert fi.read() == fo.read()
+    assert upload.load_progress() == {}
+    link_stats = upload.load_link_stats()
+    assert [transfer["failed"] for transfer in link_stats] == [True, False]
+    assert sum(transfer["bytes"] for transfer in link_stats) == 50000
+
+
+def test_resume_binary_size(upload_dirs):
+    filepath, remote_dir = upload_dirs
+    ftp = FakeFTP(remote_dir, drop_after=20000, binary_size=True)
+
+    with pytest.raises(socket.error):
+        upload.upload(filepath, ftp)
+    # New session, back in ASCII mode
+    ftp.binary = False
+    upload.upload(filepath, ftp)
+
+    assert ftp.stored == [None, 24576]
+
+
+def test_restart_without_rest(upload_dirs):
+    filepath, remote_dir = upload_dirs
+    ftp = FakeFTP(remote_dir, rest=False, drop_after=20000)
+
+    with pytest.raises(socket.error):
+        upload.upload(filepath, ftp)
+    upload.upload(filepath, ftp)
+
+    assert ftp.stored == [None, None]
+    assert os.path.getsize(os.path.join(remote_dir, "data.tar.gz")) == 50000
+
+
+def test_unrecorded_remote_file_restarts(upload_dirs):
+    filepath, remote_dir = upload_dirs
+    with open(os.path.join(remote_dir, "data.tar.gz"), "wb") as fo:
+        fo.write(b"stale")
+    ftp = FakeFTP(remote_dir)
+
+    upload.upload(filepath, ftp)
+
+    assert ftp.stored == [None]
+    assert os.path.getsize(os.path.join(remote_dir, "data.tar.gz")) == 50000
+
+
+def test_select_chunk_size():
+    def transfers(n, failed):
+        return [{"bytes": 100000, "seconds": 400, "failed": failed}] * n
+
+    assert upload.select_chunk_size([]) == upload.FTP_CHUNK_SIZE
+    good = upload.select_chunk_size(transfers(10, False))
+    bad = upload.select_chunk_size(transfers(5, False) + transfers(5, True))
+    assert good == max(upload.FTP_CHUNK_SIZES)
+    assert bad < good
+
+
+def test_budget_defers_upload(upload_dirs, tmpdir, mocker):
+    filepath, remote_dir = upload_dirs
+    other_filepath = str(tmpdir.join("PWR.log"))
+    tmpdir.join("PWR.log").write("12.8\n")
+    queued = upload.queue_filepaths([filepath, other_filepath], tarball=False)
+    ftp = FakeFTP(remote_dir)
+    ftp_session = mocker.patch("honcho.tasks.upload.ftp_session")
+    ftp_session.return_value.__enter__.return_value = ftp
+    mocker.patch(
+        "honcho.tasks.common.EXECUTION_LOG_FILEPATH",
+        lambda name: str(tmpdir.join(name + ".json")),
+    )
+    budget = upload.UploadBudget
+    mocker.patch("honcho.tasks.upload.UploadBudget", lambda: budget(40000, 60))
+
+    # Too many bytes for the budget, the smaller file still goes
+    upload.execute()
+    assert os.listdir(remote_dir) == ["PWR.log"]
+    assert not os.path.exists(queued[1])
+    assert os.path.exists(queued[0])
+
+    # Enough bytes, but the link is too slow to send them in time
+    mocker.patch("honcho.tasks.upload.UploadBudget", lambda: budget(100000, 60))
+    upload.record_transfer(1000, 100, False)
+    upload.execute()
+    assert os.path.exists(queued[0])
+
+    upload.record_transfer(1000000, 100, False)
+    upload.execute()
+    assert sorted(os.listdir(remote_dir)) == ["PWR.log", "data.tar.gz"]
+    assert not os.path.exists(queued[0])
+
+
+def test_queue_order(tmpdir, mocker):
+    mocker.patch("honcho.tasks.upload.UPLOAD_QUEUE_DIR", str(tmpdir))
+    filenames = (
+        "2020_01_01_00_00_00_DTS.tgz.part0",
+        "image.jpg",
+        "PWR.log",
+        "2020_01_01_00_00_00_WXT.tgz",
+        "2020_01_01_00_00_00_ORD.tgz",
+        "2020_01_01_00_00_00_DTS.tgz.partial1",
+        "2020_01_01_00_00_00_DTS.tgz.partialparity0",
+    )
+    for i, filename in enumerate(filenames):
+        tmpdir.join(filename).write("x" * (10 + i))
+    # Queued two and a half days ago, moves up past WXT
+    queued = time.time() - 2.5 * 24 * 3600
+    os.utime(str(tmpdir.join("2020_01_01_00_00_00_DTS.tgz.part0")), (queued, queued))
+
+    queue = [os.path.basename(filepath) for filepath in upload.get_queue()]
+    assert queue == [
+        "PWR.log",
+        "2020_01_01_00_00_00_ORD.tgz",
+        "2020_01_01_00_00_00_DTS.tgz.part0",
+        "2020_01_01_00_00_00_WXT.tgz",
+        "image.jpg",
+    ]
+
+
+def test_dedupe(upload_dirs, tmpdir, mocker):
+    filepath, _ = upload_dirs
+    other_filepath = str(tmpdir.join("PWR.log"))
+    tmpdir.join("PWR.log").write("12.8\n")
+
+    queued = upload.queue_filepaths([filepath, other_filepath], tarball=False)
+    assert len(queued) == 2
+    # Same file is already queued
+    assert upload.queue_filepaths([filepath], postfix="PWR") == []
+    assert upload.queued_filename("/data/image.jpg", postfix="CAM") == "image_CAM.jpg"
+    assert upload.queued_filename("/data/PWR.log", postfix="PWR") == "PWR.log"
+
+    # Queued files are not read again to dedupe them or mark them uploaded
+    compute_checksum = mocker.patch(
+        "honcho.tasks.upload.compute_checksum", side_effect=upload.compute_checksum
+    )
+    assert upload.queue_filepaths([filepath], tarball=False) == []
+    assert upload.drop_uploaded(queued) == queued
+    upload.set_uploaded(queued[0])
+    assert not compute_checksum.called
+    os.remove(queued[0])
+    assert upload.queue_filepaths([filepath], tarball=False) == []
+    # Re-queued copies of uploaded content are dropped before dialing out
+    shutil.copy(filepath, queued[0])
+    assert upload.drop_uploaded(queued) == queued[1:]
+    assert not os.path.exists(queued[0])
+
+
+def test_queue_log_tail(upload_dirs, tmpdir, mocker):
+    mocker.patch(
+        "honcho.tasks.upload.UPLOAD_LOG_OFFSETS_FILEPATH",
+        str(tmpdir.join("upload_log_offsets.json")),
+    )
+    log = tmpdir.join("PWR.log")
+    log.write("12.8\n")
+    assert upload.queue_log_tail(str(log)) is not None
+    assert upload.queue_log_tail(str(log)) is None
+
+    log.write("12.7\n12.6\n", mode="a")
+    second = upload.queue_log_tail(str(log))
+    with open(second, "rb") as fi:
+        header, data = fi.readline().split(), fi.read()
+    assert header[0] == b"#SEGMENT" and header[3:] == [b"5", b"15"]
+    assert data == b"12.7\n12.6\n"
+    assert upload.get_tag(os.path.basename(second)) == "PWR"
+
+    # Cleared log starts a new generation from the beginning
+    log.remove()
+    log.write("12.5\n")
+    third = upload.queue_log_tail(str(log))
+    assert third.endswith(".0000000000.seg")
+    with open(third, "rb") as fi:
+        assert fi.read().endswith(b" 0 5\n12.5\n")
+    assert upload.queue_log_tail(str(tmpdir.join("missing.log"))) is None
@@ -1,6 +1,11 @@
+import os
+import tarfile
+import time
 from datetime import datetime
 
-from honcho.util import average_datetimes
+import honcho.tasks.archive as archive
+import pytest
+from honcho.util import average_datetimes, serial_request, serial_response
 
 
 def test_average_datetimes():
@@ -13,3 +18,85 @@ def test_average_datetimes():
     expected = datetime(2019, 10, 1, 14, 0, 0)
 
     assert average_datetimes(datetimes) == expected
+
+
+def test_archive_codecs(tmpdir, mocker):
+    mocker.patch("honcho.tasks.archive.DATA_DIR", lambda tag: str(tmpdir.join(tag)))
+    filepath = tmpdir.mkdir("DTS").join("trace.csv")
+    filepath.write("-1.23,4.56\n" * 1000)
+    tmpdir.mkdir("WXT")
+    output_dir = str(tmpdir.mkdir("archive"))
+
+    expected = (
+        ("CAM", ".tar", "r:"),
+        ("DTS", ".tbz2", "r:bz2"),
+        ("WXT", ".tgz", "r:gz"),
+    )
+    for tag, extension, mode in expected:
+        output_filepath = archive.archive_filepaths(
+            [str(filepath)], postfix=tag, output_directory=output_dir
+        )
+        assert output_filepath.endswith("_" + tag + extension)
+        with tarfile.open(output_filepath, mode) as tar:
+            assert tar.getnames() == ["trace.csv"]
+
+    results = archive.benchmark_codecs(tags=("DTS", "WXT"))
+    assert [result[:3] for result in results] == [
+        ("DTS",) + codec for codec in archive.BENCHMARK_CODECS
+    ]
+    assert results[0][4] < 1 < results[-1][4]
+
+
+@pytest.fixture
+def split_mock(serial_mock):
+    def split_listener(port):
+        while 1:
+            res = b""
+            while not res.endswith(b"\r\n"):
+                res += os.read(port, 1)
+
+            # respond in pieces so expected pattern straddles reads
+            os.write(port, b"<Remote")
+            time.sleep(0.1)
+            os.write(port, b"Reply>OK</Remote")
+            time.sleep(0.1)
+            os.write(port, b"Reply>\r\n")
+
+    with serial_mock(listener=split_listener, baud=9600, timeout=60) as serial:
+        yield serial
+
+
+def test_serial_request(split_mock):
+    start = time.time()
+    response = serial_request(split_mock, "PING", "</RemoteReply>\r\n", timeout=5)
+
+    assert response == "<RemoteReply>OK</RemoteReply>\r\n"
+    assert time.time() - start < 1
+    assert split_mock.timeout == 60
+
+
+class ChunkedSerial(object):
+    """
+    Port returning the response in the given chunks, one per read
+    """
+
+    port = "chunked"
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.timeout = 60
+
+    def inWaiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size):
+        return self.chunks.pop(0) if self.chunks else ""
+
+
+def test_serial_response_whole_match():
+    # Anchored and longer than any read, the start is well before the last chunk
+    serial = ChunkedSerial(["<Start>", "x" * 2000, "</End>\r\n"])
+    response = serial_response(serial, "^<Start>x+</End>", timeout=1)
+
+    assert response.endswith("</End>\r\n")
+    assert serial.timeout == 60
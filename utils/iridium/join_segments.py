@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+'''
+Reassemble append-only logs (e.g. PWR.log) from the segments the station uploads
+
+Each segment (LOG.GENERATION.START.seg) starts with a header line:
+    #SEGMENT <log filename> <generation> <start offset> <end offset>
+followed by the bytes appended to the log between those offsets. A generation
+is one life of the log on the station, between being created and cleared.
+
+To run:
+    $ python join_segments.py --output ./logs *.seg
+'''
+import argparse
+from collections import defaultdict
+from pathlib import Path
+
+HEADER_PREFIX = b'#SEGMENT '
+
+
+def read_segment(filepath):
+    with open(filepath, 'rb') as f:
+        header = f.readline()
+        if not header.startswith(HEADER_PREFIX):
+            raise Exception(f'{filepath} is not a log segment')
+        log_filename, generation, start, end = header.split()[1:]
+        data = f.read()
+    start, end = int(start), int(end)
+    if len(data) != end - start:
+        raise Exception(f'{filepath} is truncated')
+
+    return log_filename.decode('ascii'), generation.decode('ascii'), start, data
+
+
+def join_segments(filepaths):
+    '''
+    Returns {(log filename, generation): bytes}, segments uploaded more than
+    once are used once, gaps raise
+    '''
+    segments = defaultdict(dict)
+    for filepath in filepaths:
+        log_filename, generation, start, data = read_segment(filepath)
+        segments[(log_filename, generation)][start] = data
+
+    logs = {}
+    for key, by_start in segments.items():
+        joined = b''
+        for start in sorted(by_start):
+            if start != len(joined):
+                raise Exception(
+                    f'{key[0]} ({key[1]}) is missing bytes {len(joined)}-{start}'
+                )
+            joined += by_start[start]
+        logs[key] = joined
+
+    return logs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', help='Output directory', dest='output', default='.')
+    parser.add_argument('filepaths', nargs='+', help='Segment files')
+    args = parser.parse_args()
+
+    for (log_filename, generation), data in join_segments(args.filepaths).items():
+        output_filepath = Path(args.output) / f'{generation}_{log_filename}'
+        output_filepath.write_bytes(data)
+        print(output_filepath)
@@ -16,28 +16,71 @@ zipped_filename = '{{zipped_filename}}'
 correct_checksum = '{{correct_checksum}}'
 chunk_filenames = {{chunk_filenames}}
 chunk_size = {{chunk_size}}
+zipped_size = {{zipped_size}}
+# One parity chunk (XOR of the zero padded chunks) per parity_group chunks
+parity_filenames = {{parity_filenames}}
+parity_group = {{parity_group}}
 
 current_dir = Path(__file__).parent
 
-to_cleanup = set(chunk_filenames)
-to_cleanup.add(zipped_filename)
-to_cleanup.add(Path(__file__).name)
+to_cleanup = set([zipped_filename, Path(__file__).name])
+
+
+def chunk_length(i):
+    return min(chunk_size, zipped_size - i * chunk_size)
+
+
+def best_upload(filename):
+    # Use the largest of any re-uploads, None if nothing was uploaded
+    duplicates = list(current_dir.glob(filename + '*'))
+    to_cleanup.update([el.name for el in duplicates])
+    if duplicates:
+        return max(reversed(duplicates), key=lambda f: os.path.getsize(f)).name
+
 
 # Iterate through chunks, checking for re-uploads and using 'best'
+parity_filenames = [best_upload(filename) for filename in parity_filenames]
+missing = []
 for i, chunk_filename in enumerate(chunk_filenames):
-    duplicates = list(current_dir.glob(chunk_filename + '*'))
-    best = max(reversed(duplicates), key=lambda f: os.path.getsize(f))
-    chunk_filenames[i] = best.name
-    to_cleanup.update([el.name for el in duplicates])
+    best = best_upload(chunk_filename)
+    if best is None or os.path.getsize(current_dir / best) < chunk_length(i):
+        missing.append(i)
+    else:
+        chunk_filenames[i] = best
+
+# Rebuild missing chunks, one per group, from parity chunks
+for i in missing:
+    group = i // parity_group if parity_group else None
+    in_group = [
+        j for j in missing if group is not None and j // parity_group == group
+    ]
+    assert len(in_group) == 1, "Uh oh! Missing {0}".format(chunk_filenames[i])
+    assert parity_filenames[group], "Uh oh! Missing parity for {0}".format(
+        chunk_filenames[i]
+    )
+
+    with open(current_dir / parity_filenames[group], 'rb') as fi:
+        value = int.from_bytes(fi.read(), 'big')
+    group_end = min((group + 1) * parity_group, len(chunk_filenames))
+    for j in range(group * parity_group, group_end):
+        if j != i:
+            with open(current_dir / chunk_filenames[j], 'rb') as fi:
+                block = fi.read(chunk_length(j)).ljust(chunk_size, b'\0')
+            value ^= int.from_bytes(block, 'big')
+
+    chunk_filenames[i] += '.rebuilt'
+    to_cleanup.add(chunk_filenames[i])
+    with open(current_dir / chunk_filenames[i], 'wb') as fo:
+        fo.write(value.to_bytes(chunk_size, 'big')[:chunk_length(i)])
 
 
 # Write chunks to whole
 zipped_filepath = current_dir / zipped_filename
 with open(zipped_filepath, 'wb') as fo:
-    for chunk_filename in chunk_filenames:
+    for i, chunk_filename in enumerate(chunk_filenames):
         chunk_filepath = current_dir / chunk_filename
         with open(chunk_filepath, 'rb') as fi:
-            fo.write(fi.read())
+            fo.write(fi.read(chunk_length(i)))
 
 # Check checksum
 with open(zipped_filepath, 'rb') as f:
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+'''
+Decode SBD messages from the station into text records
+
+Binary messages need the schema printed on the station by:
+    $ honcho sbd --schema > schema.json
+
+Compressed messages need the dictionaries uploaded by the station
+(NNN.dict, from 'honcho sbd --train-dictionary NNN') in one directory.
+
+To run:
+    $ python sbd_decoder.py --schema schema.json --dictionaries ./dicts message.sbd
+'''
+import argparse
+import json
+import zlib
+from datetime import datetime
+from struct import unpack_from
+from pathlib import Path
+
+SEP = ','
+RECORD_SEP = '|'
+TIMESTAMP_FMT = '%Y-%m-%dT%H:%M:%S'
+BINARY_FORMAT = 1
+COMPRESSED_FORMAT = 2
+
+
+def load_schema(filepath):
+    with open(filepath, 'r') as f:
+        return json.load(f)
+
+
+def read_varint(buf, pos):
+    value, shift = 0, 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            break
+    value = value // 2 if not value & 1 else -(value + 1) // 2
+
+    return value, pos
+
+
+def decode_fields(buf, pos, schema):
+    values = []
+    for field in schema:
+        kind = field['kind']
+        if kind == 'time':
+            seconds, = unpack_from('>I', buf, pos)
+            pos += 4
+            values.append(datetime.utcfromtimestamp(seconds).strftime(TIMESTAMP_FMT))
+        elif kind in ('fixed', 'int', 'hex'):
+            value, pos = read_varint(buf, pos)
+            if kind == 'fixed':
+                value = value / 10 ** field['decimals']
+            values.append(field['format'].format(value))
+        else:
+            length = buf[pos]
+            values.append(buf[pos + 1:pos + 1 + length].decode('utf-8'))
+            pos += 1 + length
+
+    return SEP.join(values), pos
+
+
+def decode_binary(buf, layout):
+    if buf[1] != layout['fingerprint']:
+        raise Exception('Message does not match schema fingerprint')
+
+    records, pos = [], 2
+    while pos < len(buf):
+        tag = layout['tags'][buf[pos]]
+        serialized, pos = decode_fields(buf, pos + 1, layout['schemas'][tag])
+        records.append(tag + SEP + serialized)
+
+    return records
+
+
+def decompress(message, dictionary_dir):
+    dictionary_filepath = Path(dictionary_dir) / f'{message[1]:03d}.dict'
+    decompressor = zlib.decompressobj(-15, zdict=dictionary_filepath.read_bytes())
+
+    return decompressor.decompress(message[2:]) + decompressor.flush()
+
+
+def decode(message, layout=None, dictionary_dir=None):
+    if message[0] == COMPRESSED_FORMAT:
+        if dictionary_dir is None:
+            raise Exception('Compressed message requires dictionaries')
+        message = decompress(message, dictionary_dir)
+
+    if message[0] == BINARY_FORMAT:
+        if layout is None:
+            raise Exception('Binary message requires a schema')
+        return decode_binary(message, layout)
+
+    return message.decode('utf-8').split(RECORD_SEP)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--schema', help='Binary schema json', dest='schema')
+    parser.add_argument(
+        '--dictionaries', help='Directory of dictionaries', dest='dictionary_dir'
+    )
+    parser.add_argument('filepaths', nargs='+', help='SBD message files')
+    args = parser.parse_args()
+
+    layout = load_schema(args.schema) if args.schema else None
+    for filepath in args.filepaths:
+        message = Path(filepath).read_bytes()
+        for record in decode(message, layout, args.dictionary_dir):
+            print(record)
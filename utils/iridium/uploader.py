@@ -15,6 +15,8 @@ HOST = 'restricted_ftp'
 FTP_TIMEOUT = 60
 UPLOAD_DIR = 'wallinb/field_uploads'
 CHUNK_SIZE = 100000
+# One XOR parity chunk per this many chunks, 0 for none
+PARITY_GROUP = 10
 CHUNK_ROOT_DIR = Path('./staged')
 JOINER_TEMPLATE = './joiner_template.py'
 
@@ -31,10 +33,12 @@ def chunk_file(filepath, chunk_dir):
     filepath = Path(filepath)
 
     n = ceil(os.path.getsize(filepath) / CHUNK_SIZE)
+    # Padded so no chunk name is a prefix of another (re-upload lookup)
+    width = len(str(n))
     chunk_filepaths = []
     with open(filepath, 'rb') as fi:
         for i in range(n):
-            chunk_filepath = chunk_dir / (filepath.name + f'.part{i}')
+            chunk_filepath = chunk_dir / (filepath.name + f'.part{i:0{width}d}')
             chunk_filepaths.append(chunk_filepath)
             with open(chunk_filepath, 'wb') as fo:
                 fo.write(fi.read(CHUNK_SIZE))
@@ -42,6 +46,26 @@ def chunk_file(filepath, chunk_dir):
     return chunk_filepaths
 
 
+def write_parity(chunk_filepaths, chunk_dir):
+    chunk_dir = Path(chunk_dir)
+
+    parity_filepaths = []
+    width = len(str(ceil(len(chunk_filepaths) / PARITY_GROUP)))
+    for i in range(0, len(chunk_filepaths), PARITY_GROUP):
+        value = 0
+        for chunk_filepath in chunk_filepaths[i:i + PARITY_GROUP]:
+            with open(chunk_filepath, 'rb') as fi:
+                value ^= int.from_bytes(fi.read().ljust(CHUNK_SIZE, b'\0'), 'big')
+        name = chunk_filepaths[0].name.rsplit('.part', 1)[0]
+        index = i // PARITY_GROUP
+        parity_filepath = chunk_dir / (name + f'.parity{index:0{width}d}')
+        parity_filepaths.append(parity_filepath)
+        with open(parity_filepath, 'wb') as fo:
+            fo.write(value.to_bytes(CHUNK_SIZE, 'big'))
+
+    return parity_filepaths
+
+
 def write_joiner(
     joiner_filepath,
     original_filename,
@@ -49,6 +73,9 @@ def write_joiner(
     correct_checksum,
     chunk_filenames,
     chunk_size,
+    zipped_size,
+    parity_filenames,
+    parity_group,
 ):
     with open(JOINER_TEMPLATE, 'r') as f:
         template = Template(f.read())
@@ -59,6 +86,9 @@ def write_joiner(
             correct_checksum=correct_checksum,
             chunk_filenames=chunk_filenames,
             chunk_size=chunk_size,
+            zipped_size=zipped_size,
+            parity_filenames=parity_filenames,
+            parity_group=parity_group,
         )
 
     with open(joiner_filepath, 'w') as f:
@@ -96,8 +126,10 @@ def chunk_and_upload(original_filepath):
     # Calculate checksum
     checksum = compute_checksum(zipped_filepath)
 
-    # Dice up into chunks
+    # Dice up into chunks, with parity chunks to rebuild lost ones
+    zipped_size = os.path.getsize(zipped_filepath)
     chunk_filepaths = chunk_file(zipped_filepath, chunk_dir)
+    parity_filepaths = write_parity(chunk_filepaths, chunk_dir) if PARITY_GROUP else []
 
     # Delete whole zipped file
     os.remove(zipped_filepath)
@@ -111,6 +143,9 @@ def chunk_and_upload(original_filepath):
         correct_checksum=checksum,
         chunk_filenames=[el.name for el in chunk_filepaths],
         chunk_size=CHUNK_SIZE,
+        zipped_size=zipped_size,
+        parity_filenames=[el.name for el in parity_filepaths],
+        parity_group=PARITY_GROUP,
     )
 
     return
@@ -123,9 +158,9 @@ def chunk_and_upload(original_filepath):
         file_directory = ftp.mkd(original_filepath.name)
         ftp.cwd(file_directory)
 
-        for chunk_filepath in chunk_filepaths:
-            with open(chunk_filepath, 'r') as f:
-                ftp.storlines('STOR {}'.format(chunk_filepath.name), f)
+        for chunk_filepath in chunk_filepaths + parity_filepaths:
+            with open(chunk_filepath, 'rb') as f:
+                ftp.storbinary('STOR {}'.format(chunk_filepath.name), f)
             # Chunk upload complete, delete chunk locally
             os.remove(chunk_filepath)
 
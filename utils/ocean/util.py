@@ -1,7 +1,7 @@
 import logging
 import os
 import re
-from time import sleep, time
+from time import time
 
 logger = logging.getLogger(__name__)
 
@@ -14,28 +14,38 @@ def serial_request(serial, command, expected_regex=".+", timeout=10, poll=1):
 
     logger.debug("Sending command to {0}: {1}".format(serial.port, command.strip()))
     serial.flushInput()
-    sleep(1)
     serial.write(command)
-    sleep(1)
-    start_time = time()
+
+    pattern = re.compile(expected_regex, flags=re.DOTALL)
+    port_timeout = serial.timeout
+    deadline = time() + timeout
     response = ""
-    response_length = len(response)
-    while time() - start_time < timeout:
-        response += serial.read(serial.inWaiting())
-        if re.search(expected_regex, response, flags=re.DOTALL):
-            break
-
-        new_response_length = len(response)
-        if new_response_length > response_length:
-            start_time = time()
-            response_length = new_response_length
-
-        sleep(poll)
-    else:
-        logger.debug(
-            "Response collected from serial at timeout: {0}".format(response.strip())
-        )
-        raise Exception("Timed out waiting for expected serial response")
+    try:
+        while True:
+            remaining = deadline - time()
+            if remaining <= 0:
+                logger.debug(
+                    "Response collected from serial at timeout: {0}".format(
+                        response.strip()
+                    )
+                )
+                raise Exception("Timed out waiting for expected serial response")
+
+            read_timeout = min(poll, remaining)
+            if serial.timeout != read_timeout:
+                serial.timeout = read_timeout
+            received = serial.read(max(1, serial.inWaiting()))
+            if not received:
+                continue
+
+            response += received
+            # Matches may start anywhere in the response and finish in the new data
+            if pattern.search(response):
+                break
+
+            deadline = time() + timeout
+    finally:
+        serial.timeout = port_timeout
 
     logger.debug("Response collected from serial: {0}".format(response))
 